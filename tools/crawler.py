@@ -1,20 +1,617 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import json
+import os
 import time
+import random
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 import logging
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urldefrag, urlparse
+from email.utils import parsedate_to_datetime
+import argparse
+from html import escape
+from string import Template
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    etree = None
+
+class PageCache:
+    """页面磁盘缓存，保存正文及 ETag/Last-Modified，用于条件请求"""
+
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.cache_dir / 'index.json'
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.entries = self.load_index()
+
+    def load_index(self):
+        """加载缓存索引，丢弃正文文件已不存在的条目"""
+        entries = {}
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except Exception as e:
+                logging.warning(f"读取缓存索引失败，将重建缓存: {str(e)}")
+        entries = {url: entry for url, entry in entries.items() if (self.cache_dir / entry['file']).exists()}
+        # 进程异常退出时索引没有写回，删除不在索引中的正文文件，保证容量上限有效
+        indexed = {entry['file'] for entry in entries.values()}
+        for path in self.cache_dir.glob('*.html'):
+            if path.name not in indexed:
+                path.unlink(missing_ok=True)
+        return entries
+
+    def save(self):
+        """写回缓存索引"""
+        with self.lock:
+            tmp_file = self.index_file.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            tmp_file.replace(self.index_file)
+
+    def conditional_headers(self, url):
+        """根据已缓存的校验信息生成条件请求头"""
+        with self.lock:
+            entry = self.entries.get(url)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def load(self, url):
+        """服务器返回 304 时读取缓存的正文"""
+        with self.lock:
+            entry = self.entries.get(url)
+            if not entry:
+                return None
+            entry['accessed'] = time.time()
+            self.hits += 1
+        try:
+            return (self.cache_dir / entry['file']).read_text(encoding='utf-8')
+        except OSError:
+            return None
+
+    def store(self, url, response):
+        """缓存带校验信息的响应，超出容量时淘汰最久未使用的条目"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        with self.lock:
+            self.misses += 1
+        if not etag and not last_modified:
+            return
+        body = response.text.encode('utf-8')
+        file_name = hashlib.sha1(url.encode('utf-8')).hexdigest() + '.html'
+        (self.cache_dir / file_name).write_bytes(body)
+        with self.lock:
+            self.entries[url] = {
+                'file': file_name,
+                'etag': etag,
+                'last_modified': last_modified,
+                'size': len(body),
+                'accessed': time.time()
+            }
+            self.evict()
+
+    def evict(self):
+        """按最近访问时间淘汰条目，直到总大小不超过上限（调用方持有锁）"""
+        total = sum(entry['size'] for entry in self.entries.values())
+        if total <= self.max_bytes:
+            return
+        for url, entry in sorted(self.entries.items(), key=lambda item: item[1]['accessed']):
+            if total <= self.max_bytes:
+                break
+            (self.cache_dir / entry['file']).unlink(missing_ok=True)
+            del self.entries[url]
+            total -= entry['size']
+
+
+class SoupParser:
+    """BeautifulSoup(html.parser) 解析实现，逐层 find/find_all 查找"""
+    name = 'bs4'
+
+    def parse_categories(self, html):
+        """解析左侧导航栏分类"""
+        soup = BeautifulSoup(html, 'html.parser')
+        categories = []
+
+        # 查找主导航菜单  （在 sidebar-nav 中的 sidebar-menu）
+        sidebar_menu = soup.find('div', class_='sidebar-menu flex-fill')
+        if sidebar_menu:
+            # 查找所有主菜单项（在 sidebar-menu-inner 中）
+            menu_inner = sidebar_menu.find('div', class_='sidebar-menu-inner')
+            if menu_inner:
+                # 遍历所有导航项
+                nav_items = menu_inner.find_all('li', class_='sidebar-item')
+                for item in nav_items:
+                    # 获取主分类名称
+                    for nav in item.find_all('a', class_='smooth'):
+                        categories.append({
+                            'name': nav.text.strip(),
+                            'url': nav.get('href')
+                        })
+        return categories
+
+    def parse_cards(self, html):
+        """解析页面中的工具卡片"""
+        soup = BeautifulSoup(html, 'html.parser')
+        cards = []
+
+        # 查找所有工具卡片
+        rows = soup.find_all('div', class_='row io-mx-n2')
+        for row in rows:
+            segments = row.find_all('div', class_='url-card io-px-2 col-6 col-2a col-sm-2a col-md-2a col-lg-3a col-xl-6a col-xxl-6a')
+            for segment in segments:
+                try:
+                    item = segment.find('a')
+                    content = item.find('div', class_='text-sm overflowClip_1')
+                    description = item.find('p')
+                    cards.append({
+                        'name': content.text.strip(),
+                        'description': description.text.strip(),
+                        'url': item.get('href') if item else '',
+                    })
+                except Exception as e:
+                    logging.error(f"解析卡片失败: {str(e)}")
+        return cards
+
+
+def has_class(*names):
+    """生成按 class 名匹配的 XPath 条件，与 class 的顺序及其他 class 无关"""
+    return ' and '.join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in names)
+
+
+class LxmlParser:
+    """lxml 解析实现，文档只解析一次，用预编译的 XPath 一次取出所有节点"""
+    name = 'lxml'
 
-class AIBotCrawler:
     def __init__(self):
+        # 等价于 CSS 选择器 div.sidebar-menu.flex-fill div.sidebar-menu-inner li.sidebar-item
+        self.nav_items = etree.XPath(
+            f"(//div[{has_class('sidebar-menu', 'flex-fill')}]//div[{has_class('sidebar-menu-inner')}])[1]"
+            f"//li[{has_class('sidebar-item')}]"
+        )
+        self.nav_links = etree.XPath(f".//a[{has_class('smooth')}]")
+        # 等价于 CSS 选择器 div.row.io-mx-n2:not(.ajax-list-body) div.url-card.io-px-2
+        # 先筛卡片再检查祖先，比从行节点向下做后代查找快一个数量级
+        self.card_segments = etree.XPath(
+            f"//div[{has_class('url-card', 'io-px-2')}]"
+            f"[ancestor::div[{has_class('row', 'io-mx-n2')} and not({has_class('ajax-list-body')})]]"
+        )
+        self.card_link = etree.XPath(".//a[1]")
+        self.card_name = etree.XPath(f".//div[{has_class('text-sm', 'overflowClip_1')}][1]")
+        self.card_description = etree.XPath(".//p[1]")
+        # 同一页面先后解析分类和卡片时复用已构建的文档树
+        self.last_document = (None, None)
+
+    def document(self, html):
+        """解析 HTML 文档，连续解析同一页面时只构建一次"""
+        last_html, tree = self.last_document
+        if html is not last_html:
+            tree = lxml.html.fromstring(html)
+            self.last_document = (html, tree)
+        return tree
+
+    def parse_categories(self, html):
+        """解析左侧导航栏分类"""
+        tree = self.document(html)
+        categories = []
+        for item in self.nav_items(tree):
+            for nav in self.nav_links(item):
+                categories.append({
+                    'name': nav.text_content().strip(),
+                    'url': nav.get('href')
+                })
+        return categories
+
+    def parse_cards(self, html):
+        """解析页面中的工具卡片"""
+        tree = self.document(html)
+        cards = []
+        for segment in self.card_segments(tree):
+            try:
+                item = self.card_link(segment)[0]
+                content = self.card_name(item)[0]
+                description = self.card_description(item)[0]
+                cards.append({
+                    'name': content.text_content().strip(),
+                    'description': description.text_content().strip(),
+                    'url': item.get('href'),
+                })
+            except Exception as e:
+                logging.error(f"解析卡片失败: {str(e)}")
+        return cards
+
+
+PARSERS = {parser.name: parser for parser in (SoupParser, LxmlParser)}
+
+
+def compare_parsers(html, rounds=5):
+    """用同一份 HTML 对比各解析实现的耗时，并检查结果是否一致"""
+    timings = {}
+    outputs = {}
+    for name, parser_class in PARSERS.items():
+        if name == 'lxml' and etree is None:
+            continue
+        start = time.perf_counter()
+        for _ in range(rounds):
+            # 每轮使用新的解析器实例，避免复用上一轮的文档树
+            parser = parser_class()
+            outputs[name] = (parser.parse_categories(html), parser.parse_cards(html))
+        timings[name] = (time.perf_counter() - start) / rounds
+    baseline = outputs[SoupParser.name]
+    for name, seconds in timings.items():
+        same = '一致' if outputs[name] == baseline else '不一致'
+        logging.info(f"解析器 {name}: 平均 {seconds * 1000:.1f} ms/页，"
+                     f"分类 {len(outputs[name][0])} 个，卡片 {len(outputs[name][1])} 个，与 bs4 结果{same}")
+    return timings
+
+
+class ResultWriter:
+    """以 NDJSON 格式逐条写出爬取结果，按批刷盘并记录可恢复的检查点"""
+
+    def __init__(self, path, checkpoint_path, batch_size=200, resume=False):
+        self.path = Path(path)
+        self.checkpoint_path = Path(checkpoint_path)
+        self.batch_size = batch_size
+        self.buffer = []
+        self.pending_pages = []
+        self.done_pages = set()
+        offset = 0
+        if resume and self.checkpoint_path.exists():
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            offset = checkpoint['offset']
+            self.done_pages = set(checkpoint['done_pages'])
+            if not self.path.exists() or self.path.stat().st_size < offset:
+                logging.warning(f"结果文件与检查点不一致，重新开始: {self.path}")
+                offset = 0
+                self.done_pages = set()
+            else:
+                logging.info(f"从检查点恢复，已完成 {len(self.done_pages)} 个页面")
+        self.file = open(self.path, 'ab' if offset else 'wb')
+        # 丢弃检查点之后写入的不完整数据
+        self.file.truncate(offset)
+        self.file.seek(offset)
+
+    def records(self):
+        """逐行读取已写入的结果"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def write(self, kind, record):
+        """写入一条结果，缓冲区满时刷盘"""
+        self.buffer.append(json.dumps({'type': kind, **record}, ensure_ascii=False) + '\n')
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def page_done(self, key):
+        """标记页面已处理完，随下一次刷盘写入检查点"""
+        self.pending_pages.append(key)
+
+    def flush(self):
+        """把缓冲区写入磁盘，再更新检查点"""
+        if self.buffer:
+            self.file.write(''.join(self.buffer).encode('utf-8'))
+            self.buffer = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.done_pages.update(self.pending_pages)
+        self.pending_pages = []
+        tmp_file = self.checkpoint_path.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'offset': self.file.tell(), 'done_pages': sorted(self.done_pages)}, f, ensure_ascii=False)
+        tmp_file.replace(self.checkpoint_path)
+
+    def close(self, completed=True):
+        """刷盘并关闭文件，全部完成时删除检查点"""
+        self.flush()
+        self.file.close()
+        if completed:
+            self.checkpoint_path.unlink(missing_ok=True)
+
+
+class FingerprintIndex:
+    """记录页面与卡片的内容指纹，增量爬取时跳过未变化的页面并计算卡片变更"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.pages = {}
+        self.current = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.pages = json.load(f)
+            except Exception as e:
+                logging.warning(f"读取指纹索引失败，将全部重新解析: {str(e)}")
+
+    @staticmethod
+    def digest(text):
+        """计算内容哈希"""
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def card_key(card):
+        """卡片以链接作为标识，没有链接时使用名称"""
+        return card.get('url') or card.get('name')
+
+    def unchanged(self, url, page_hash):
+        """页面内容是否与上次相同；相同则沿用上次的卡片指纹"""
+        entry = self.pages.get(url)
+        if entry and entry['hash'] == page_hash:
+            self.current[url] = entry
+            return True
+        return False
+
+    def update(self, url, page_hash, cards):
+        """记录重新解析后的页面指纹和卡片指纹"""
+        self.current[url] = {
+            'hash': page_hash,
+            'cards': {
+                self.card_key(card): self.digest(json.dumps(card, ensure_ascii=False, sort_keys=True))
+                for card in cards
+            }
+        }
+
+    def diff(self, parsed_cards):
+        """对比上次与本次的卡片指纹，parsed_cards 为本次重新解析出的 {key: card}"""
+        old = {key: value for entry in self.pages.values() for key, value in entry['cards'].items()}
+        new = {key: value for entry in self.current.values() for key, value in entry['cards'].items()}
+        added = [parsed_cards[key] for key in new if key not in old and key in parsed_cards]
+        changed = [parsed_cards[key] for key in new
+                   if key in old and old[key] != new[key] and key in parsed_cards]
+        removed = [key for key in old if key not in new]
+        return added, changed, removed
+
+    def save(self):
+        """保存本次的指纹索引，未再出现的页面随之删除"""
+        tmp_file = self.path.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.current, f, ensure_ascii=False)
+        tmp_file.replace(self.path)
+        self.pages = self.current
+
+
+# 抓取优先级：数值越小越先抓取
+PRIORITY_CATEGORY = 0
+PRIORITY_DETAIL = 1
+
+
+class TokenBucket:
+    """线程安全的令牌桶，令牌不足时 acquire 阻塞等待"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取走一个令牌，必要时等待令牌补充"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostScheduler:
+    """按主机限速的调度器，根据响应延迟和 429 自适应调整请求速率与并发数"""
+
+    def __init__(self, rate=5.0, burst=5, max_concurrency=4, target_latency=2.0, min_rate=0.2):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.buckets = {}
+        self.limits = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, host):
+        """获取主机对应的令牌桶"""
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return self.buckets[host]
+
+    def concurrency(self, host):
+        """主机当前允许的并发数，从一半的上限开始逐步调整"""
+        with self.lock:
+            return self.limits.setdefault(host, max(1, self.max_concurrency // 2))
+
+    def throttle(self, url):
+        """发送请求前按主机限速"""
+        self.bucket(urlparse(url).netloc).acquire()
+
+    def record(self, url, status, latency):
+        """根据一次请求的结果调整主机的速率和并发数（加性增、乘性减）"""
+        host = urlparse(url).netloc
+        bucket = self.bucket(host)
+        limit = self.concurrency(host)
+        with self.lock:
+            if status in (429, 503):
+                self.limits[host] = max(1, limit // 2)
+                with bucket.lock:
+                    bucket.rate = max(self.min_rate, bucket.rate / 2)
+                logging.warning(f"{host} 返回 {status}，降低为 {bucket.rate:.2f} 次/秒，并发 {self.limits[host]}")
+            elif status is None or latency > self.target_latency:
+                self.limits[host] = max(1, limit - 1)
+            else:
+                self.limits[host] = min(self.max_concurrency, limit + 1)
+                with bucket.lock:
+                    bucket.rate = min(self.rate, bucket.rate * 1.1)
+
+
+# HTML 报告模板
+REPORT_HEAD = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>$title</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        .categories li { display: inline-block; margin: 0 10px 5px 0; }
+        .item { margin: 10px 0; padding: 10px; border: 1px solid #ddd; }
+        .pager { margin: 20px 0; }
+        .pager a { margin-right: 10px; }
+    </style>
+</head>
+<body>
+<h1>$title</h1>
+""")
+REPORT_CATEGORY = Template("<li><a href='$url' target='_blank'>$name</a></li>\n")
+REPORT_CARD = Template("<div class='item'><h4>$name</h4><p>$description</p>$link</div>\n")
+REPORT_CARD_LINK = Template("<p><a href='$url' target='_blank'>访问链接</a></p>")
+REPORT_PAGER_LINK = Template("<a href='$file'>$label</a>")
+REPORT_TAIL = "</body></html>\n"
+
+
+class HtmlReportWriter:
+    """逐条写出 HTML 报告，可按固定卡片数分页，内存占用与结果规模无关"""
+
+    def __init__(self, output_dir, base_url, page_size=None, title='AI工具导航'):
+        self.output_dir = Path(output_dir)
+        self.base_url = base_url
+        self.page_size = page_size
+        self.title = escape(title)
+        self.page = 0
+        self.page_cards = 0
+        self.section = None
+        self.file = None
+
+    def page_file(self, page):
+        """第 1 页为 report.html，之后为 report_2.html、report_3.html ……"""
+        return 'report.html' if page == 1 else f'report_{page}.html'
+
+    def open_page(self):
+        """开始新的一页，并写入指向上一页的链接"""
+        self.page += 1
+        self.page_cards = 0
+        self.section = None
+        self.file = open(self.output_dir / self.page_file(self.page), 'w', encoding='utf-8')
+        self.file.write(REPORT_HEAD.substitute(title=self.title))
+        if self.page > 1:
+            self.file.write("<div class='pager'>")
+            self.file.write(REPORT_PAGER_LINK.substitute(file=self.page_file(self.page - 1), label='上一页'))
+            self.file.write("</div>\n")
+
+    def close_page(self, has_next=False):
+        """结束当前页，有下一页时写入翻页链接"""
+        self.enter_section(None)
+        if has_next:
+            self.file.write("<div class='pager'>")
+            self.file.write(REPORT_PAGER_LINK.substitute(file=self.page_file(self.page + 1), label='下一页'))
+            self.file.write("</div>\n")
+        self.file.write(REPORT_TAIL)
+        self.file.close()
+        self.file = None
+
+    def enter_section(self, section):
+        """切换到分类列表或工具列表区域"""
+        if section == self.section:
+            return
+        if self.section == 'category':
+            self.file.write("</ul></div>\n")
+        elif self.section == 'card':
+            self.file.write("</div>\n")
+        if section == 'category':
+            self.file.write("<div class='categories'><h2>分类</h2><ul>\n")
+        elif section == 'card':
+            self.file.write("<div class='cards'><h2>工具</h2>\n")
+        self.section = section
+
+    def write(self, record):
+        """写入一条结果记录（type 为 category 或 card）"""
+        if self.file is None:
+            self.open_page()
+        if record['type'] == 'category':
+            self.enter_section('category')
+            self.file.write(REPORT_CATEGORY.substitute(
+                url=escape(urljoin(self.base_url, record.get('url') or '')),
+                name=escape(record['name'])
+            ))
+        elif record['type'] == 'card':
+            if self.page_size and self.page_cards >= self.page_size:
+                self.close_page(has_next=True)
+                self.open_page()
+            self.enter_section('card')
+            link = REPORT_CARD_LINK.substitute(url=escape(record['url'])) if record.get('url') else ''
+            self.file.write(REPORT_CARD.substitute(
+                name=escape(record['name']),
+                description=escape(record.get('description') or ''),
+                link=link
+            ))
+            self.page_cards += 1
+
+    def close(self):
+        """结束报告，删除上次生成但本次已不需要的分页文件"""
+        if self.file is None:
+            self.open_page()
+        self.close_page()
+        stale = self.page + 1
+        while (self.output_dir / self.page_file(stale)).exists():
+            (self.output_dir / self.page_file(stale)).unlink()
+            stale += 1
+        return self.page
+
+
+class AIBotCrawler:
+    def __init__(self, max_concurrency=16, max_per_host=4, follow_details=False, use_cache=True,
+                 parser='lxml', requests_per_second=5.0, report_page_size=None):
         self.base_url = "https://ai-bot.cn/"
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         }
+        # 并发抓取配置：总并发数、单个主机的并发数上限、是否继续抓取站内详情页
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.follow_details = follow_details
+        # 单个主机的请求速率和并发数由调度器根据延迟和 429 动态调整
+        self.scheduler = HostScheduler(rate=requests_per_second, max_concurrency=max_per_host)
+        # 请求重试配置：超时秒数、最大重试次数、首次退避秒数、退避上限、需要重试的状态码
+        self.timeout = 15
+        self.max_retries = 3
+        self.retry_backoff = 0.5
+        self.retry_max_backoff = 30
+        self.retry_statuses = {429, 500, 502, 503, 504}
+        self.session = self.create_session()
         self.output_dir = Path("output")
         self.output_dir.mkdir(exist_ok=True)
+        # HTML 报告每页的工具数，None 表示不分页
+        self.report_page_size = report_page_size
+        # 先配置日志，加载缓存时的警告也写入 crawler.log
         self.setup_logging()
+        # 条件请求缓存：未变化的页面由服务器返回 304，直接使用本地副本
+        self.cache = PageCache(self.output_dir / 'http_cache') if use_cache else None
+        if parser == 'lxml' and etree is None:
+            logging.warning("未安装 lxml，改用 bs4 解析")
+            parser = 'bs4'
+        self.parser = PARSERS[parser]()
 
     def setup_logging(self):
         """设置日志"""
@@ -27,116 +624,373 @@ class AIBotCrawler:
             ]
         )
 
+    def create_session(self):
+        """创建共享会话，连接池按并发数设置以复用 keep-alive 连接"""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=self.max_concurrency,
+            pool_maxsize=self.max_concurrency,
+            max_retries=0
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def retry_delay(self, attempt, retry_after=None):
+        """计算第 attempt 次重试前的等待秒数，优先遵守 Retry-After，但不超过退避上限"""
+        if retry_after:
+            try:
+                return min(self.retry_max_backoff, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    return min(self.retry_max_backoff, max(0.0, wait))
+                except (TypeError, ValueError):
+                    pass
+        # 指数退避，并在后一半区间内随机抖动，避免多个请求同时重试
+        delay = min(self.retry_max_backoff, self.retry_backoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def request(self, url, headers=None):
+        """发送 GET 请求，网络错误或可重试状态码按退避策略重试"""
+        for attempt in range(self.max_retries + 1):
+            self.scheduler.throttle(url)
+            start = time.monotonic()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.scheduler.record(url, None, time.monotonic() - start)
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay(attempt)
+                logging.warning(f"请求失败 {url}: {str(e)}，{delay:.1f} 秒后重试（第 {attempt + 1} 次）")
+            else:
+                self.scheduler.record(url, response.status_code, time.monotonic() - start)
+                if response.status_code not in self.retry_statuses or attempt == self.max_retries:
+                    return response
+                delay = self.retry_delay(attempt, response.headers.get('Retry-After'))
+                logging.warning(f"请求返回 {response.status_code} {url}，{delay:.1f} 秒后重试（第 {attempt + 1} 次）")
+                response.close()
+            time.sleep(delay)
+
     def get_page(self, url):
         """获取页面内容"""
         try:
-            response = requests.get(url, headers=self.headers)
+            headers = self.cache.conditional_headers(url) if self.cache else None
+            response = self.request(url, headers=headers)
+            if response.status_code == 304 and self.cache:
+                html = self.cache.load(url)
+                if html is not None:
+                    return html
+                # 缓存已被淘汰，重新完整请求
+                response = self.request(url)
             response.raise_for_status()
+            if self.cache:
+                self.cache.store(url, response)
             return response.text
         except Exception as e:
             logging.error(f"获取页面失败 {url}: {str(e)}")
             return None
 
-    def parse_categories(self):
+    def fetch_all(self, urls, on_page=None, priority=PRIORITY_CATEGORY):
+        """并发获取多个页面，返回 {url: html}
+
+        urls 中的元素可以是 url，也可以是 (url, 优先级)。传入 on_page 时每获取一页即回调处理，
+        不保留页面内容；on_page 返回的链接作为详情页继续抓取。
+        """
+        items = [item if isinstance(item, tuple) else (item, priority) for item in urls]
+        if not items:
+            return {}
+        return asyncio.run(self._fetch_all(items, on_page))
+
+    async def _fetch_all(self, items, on_page=None):
+        """按优先级调度请求，在线程池中执行 get_page，单个主机的并发数由调度器决定"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.PriorityQueue()
+        queued = set()
+        in_flight = {}
+        slot_freed = asyncio.Condition()
+        pages = {}
+
+        def enqueue(url, priority):
+            if url not in queued:
+                queued.add(url)
+                queue.put_nowait((priority, len(queued), url))
+
+        async def fetch(executor, url, host):
+            try:
+                try:
+                    html = await loop.run_in_executor(executor, self.get_page, url)
+                finally:
+                    async with slot_freed:
+                        in_flight[host] -= 1
+                        slot_freed.notify_all()
+                if on_page:
+                    for follow_url in on_page(url, html) or ():
+                        enqueue(follow_url, PRIORITY_DETAIL)
+                else:
+                    pages[url] = html
+            except Exception as e:
+                logging.error(f"处理页面失败 {url}: {str(e)}")
+            finally:
+                queue.task_done()
+
+        async def dispatch(executor):
+            # 只有一个分发协程按优先级出队，拿到并发名额后才取下一个，保证高优先级先发出
+            while True:
+                _, _, url = await queue.get()
+                host = urlparse(url).netloc
+                async with slot_freed:
+                    await slot_freed.wait_for(
+                        lambda: sum(in_flight.values()) < self.max_concurrency
+                        and in_flight.get(host, 0) < self.scheduler.concurrency(host))
+                    in_flight[host] = in_flight.get(host, 0) + 1
+                task = asyncio.create_task(fetch(executor, url, host))
+                running.add(task)
+                task.add_done_callback(running.discard)
+
+        for url, priority in items:
+            enqueue(url, priority)
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            dispatcher = asyncio.create_task(dispatch(executor))
+            await queue.join()
+            dispatcher.cancel()
+            await asyncio.gather(dispatcher, return_exceptions=True)
+        # 按传入顺序返回，保证结果顺序稳定
+        return {url: pages[url] for url, _ in items if url in pages}
+
+    def category_page_urls(self, categories):
+        """根据分类链接得到需要抓取的页面（去掉锚点并去重）"""
+        urls = [self.base_url]
+        for category in categories:
+            if category.get('url'):
+                url, _ = urldefrag(urljoin(self.base_url, category['url']))
+                urls.append(url)
+        return list(dict.fromkeys(urls))
+
+    def detail_page_urls(self, cards, exclude=()):
+        """从卡片中挑出站内详情页链接"""
+        host = urlparse(self.base_url).netloc
+        urls = []
+        for card in cards:
+            url = card.get('url')
+            if url and urlparse(url).netloc == host and url not in exclude:
+                urls.append(url)
+        return list(dict.fromkeys(urls))
+
+    def collect_cards(self, pages, seen=None):
+        """依次解析已获取的页面，跨页面按链接去重"""
+        cards = []
+        seen = set() if seen is None else seen
+        for url, html in pages.items():
+            # 获取失败的页面已按重试策略放弃，不再单独重新获取
+            if not html:
+                continue
+            page_cards = self.parse_item_detail(url, html=html) or []
+            cards.extend(card for card in page_cards if card['url'] not in seen)
+            seen.update(card['url'] for card in page_cards)
+        return cards
+
+    def parse_categories(self, html=None):
         """解析左侧导航栏分类"""
-        html = self.get_page(self.base_url)
+        if html is None:
+            html = self.get_page(self.base_url)
         if not html:
             return []
 
-        soup = BeautifulSoup(html, 'html.parser')
-        categories = []
-
-        # 查找主导航菜单  （在 sidebar-nav 中的 sidebar-menu）
-        sidebar_menu = soup.find('div', class_='sidebar-menu flex-fill')
-        if sidebar_menu:
-            # 查找所有主菜单项（在 sidebar-menu-inner 中）
-            menu_inner = sidebar_menu.find('div', class_='sidebar-menu-inner')
-            if menu_inner:
-                # 遍历所有导航项
-                nav_items = menu_inner.find_all('li', class_='sidebar-item')
-                for item in nav_items:
-                    # 获取主分类名称
-                    nav_link = item.find_all('a', class_='smooth')
-                    if nav_link:
-                        for nav in nav_link:
-                            category = {
-                                'name': nav.text.strip(),
-                                'url': nav.get('href')
-                            }
-                        
-                            if category['name']:
-                                categories.append(category)
-                                logging.info(f"找到分类: {category['name']},跳转地址：{category['url']}")
+        categories = [category for category in self.parser.parse_categories(html) if category['name']]
+        for category in categories:
+            logging.info(f"找到分类: {category['name']},跳转地址：{category['url']}")
 
         if not categories:
             logging.error("未找到任何分类，请检查选择器是否正确")
             
         return categories
 
-    def parse_item_detail(self, url):
+    def parse_item_detail(self, url, html=None):
         """解析详细内容页面"""
-        html = self.get_page(url)
+        if html is None:
+            html = self.get_page(url)
         if not html:
             return None
 
-        soup = BeautifulSoup(html, 'html.parser')
-        cards = []
+        return self.parser.parse_cards(html)
 
-        # 查找所有工具卡片
-        rows = soup.findAll('div', class_='row io-mx-n2')
-        for row in rows:
-            segments = row.findAll('div', class_='url-card io-px-2 col-6 col-2a col-sm-2a col-md-2a col-lg-3a col-xl-6a col-xxl-6a')
-            for segment in segments:
-                try:
-                    item = segment.find('a')
-                    content = item.find('div', class_='text-sm overflowClip_1')
-                    description = item.find('p')
-                    card = {
-                        'name': content.text.strip(),
-                        'description': description.text.strip(),
-                        'url':item.get('href') if item else '',
-                    }
-                    cards.append(card)
-                    
-                except Exception as e:
-                    logging.error(f"解析卡片失败: {str(e)}")
-                    continue
+    def fetch_categories(self):
+        """获取首页并解析分类，返回首页 HTML 和分类列表"""
+        home_html = self.get_page(self.base_url)
+        categories = self.parse_categories(home_html)
+        if not categories:
+            logging.error("未找到分类信息")
+        return home_html, categories
 
-        return cards
+    @contextmanager
+    def crawl_session(self):
+        """三种爬取方式共用：记录爬取过程中的异常，结束时保存缓存并输出命中情况"""
+        try:
+            yield
+        except Exception as e:
+            logging.error(f"爬取过程出错: {str(e)}")
+        finally:
+            if self.cache:
+                self.cache.save()
+                logging.info(f"缓存命中 {self.cache.hits} 个页面，重新下载 {self.cache.misses} 个页面")
 
     def crawl(self):
         """开始爬取"""
-        try:
+        with self.crawl_session():
             # 获取所有分类
-            categories = self.parse_categories()
+            home_html, categories = self.fetch_categories()
             if not categories:
-                logging.error("未找到分类信息")
                 return
 
             results = []
-            
-            details = self.parse_item_detail(self.base_url)
-            
+
+            # 并发获取所有分类页面（首页已获取，直接复用）
+            page_urls = self.category_page_urls(categories)
+            pages = self.fetch_all(url for url in page_urls if url != self.base_url)
+            pages = {self.base_url: home_html, **pages}
+            details = self.collect_cards(pages)
+
+            # 并发获取站内详情页
+            if self.follow_details:
+                detail_urls = self.detail_page_urls(details, exclude=pages)
+                logging.info(f"开始抓取 {len(detail_urls)} 个详情页")
+                detail_pages = self.fetch_all(detail_urls, priority=PRIORITY_DETAIL)
+                details += self.collect_cards(detail_pages, seen={card['url'] for card in details})
+
             category_data = {
                 'categories': categories,
                 'subcategories': details
             }
-            
-           
-            
-            
-            
-            logging.info(details)
-        
+
+            logging.info(f"共解析 {len(pages)} 个页面，{len(details)} 个工具")
 
             results.append(category_data)
 
             # 保存结果
             self.save_results(results)
             logging.info("爬取完成")
-            
-        except Exception as e:
-            logging.error(f"爬取过程出错: {str(e)}")
+
+    def crawl_stream(self, resume=False):
+        """流式爬取：每解析一个页面就把卡片写入 results.ndjson，中断后可从检查点继续"""
+        writer = ResultWriter(
+            self.output_dir / 'results.ndjson',
+            self.output_dir / 'results.checkpoint.json',
+            resume=resume
+        )
+        completed = False
+        with self.crawl_session():
+            try:
+                # 恢复时根据已写入的卡片重建去重集合，分类页中的卡片用于重建待抓取的详情页
+                seen = set()
+                resumed_cards = []
+                if writer.done_pages:
+                    for record in writer.records():
+                        if record['type'] == 'card':
+                            seen.add(record['url'])
+                            resumed_cards.append(record)
+
+                home_html, categories = self.fetch_categories()
+                if not categories:
+                    return
+                if 'categories' not in writer.done_pages:
+                    for category in categories:
+                        writer.write('category', category)
+                    writer.page_done('categories')
+
+                def handle_page(url, html):
+                    # 获取失败的页面不记入检查点，恢复时重新抓取
+                    if not html:
+                        return []
+                    # 与 collect_cards 一致：只去掉其他页面已出现过的卡片
+                    page_cards = self.parse_item_detail(url, html=html) or []
+                    for card in page_cards:
+                        if card['url'] not in seen:
+                            writer.write('card', {'page': url, **card})
+                    seen.update(card['url'] for card in page_cards)
+                    writer.page_done(url)
+                    # 与 crawl 一致只跟进一层：详情页只从分类页中取，在同一轮调度中以较低优先级抓取
+                    if self.follow_details and url in page_urls:
+                        return [detail_url for detail_url in self.detail_page_urls(page_cards)
+                                if detail_url not in writer.done_pages and detail_url not in page_urls]
+                    return []
+
+                page_urls = self.category_page_urls(categories)
+                detail_urls = []
+                if self.follow_details:
+                    detail_urls = self.detail_page_urls(record for record in resumed_cards
+                                                        if record['page'] in page_urls)
+                if self.base_url not in writer.done_pages:
+                    detail_urls.extend(handle_page(self.base_url, home_html))
+                items = [(url, PRIORITY_CATEGORY) for url in page_urls
+                         if url != self.base_url and url not in writer.done_pages]
+                items += [(url, PRIORITY_DETAIL) for url in detail_urls
+                          if url not in writer.done_pages and url not in page_urls]
+                self.fetch_all(items, on_page=handle_page)
+
+                writer.flush()
+                self.write_report(writer.records())
+                completed = True
+                logging.info(f"爬取完成，结果已写入 {writer.path}")
+            finally:
+                writer.close(completed)
+
+    def crawl_incremental(self):
+        """增量爬取：只解析内容有变化的页面，把新增、修改、删除的卡片写入 delta.json"""
+        index = FingerprintIndex(self.output_dir / 'fingerprints.json')
+        with self.crawl_session():
+            home_html, categories = self.fetch_categories()
+            if not categories:
+                return
+
+            parsed_cards = {}
+            stats = {'total': 0, 'parsed': 0}
+
+            def handle_page(url, html):
+                if not html:
+                    # 获取失败时沿用上次的指纹，避免把该页的卡片误判为删除
+                    if url in index.pages:
+                        index.current[url] = index.pages[url]
+                    return []
+                stats['total'] += 1
+                page_hash = index.digest(html)
+                if index.unchanged(url, page_hash):
+                    card_urls = list(index.current[url]['cards'])
+                else:
+                    stats['parsed'] += 1
+                    page_cards = self.parse_item_detail(url, html=html) or []
+                    index.update(url, page_hash, page_cards)
+                    for card in page_cards:
+                        parsed_cards.setdefault(index.card_key(card), card)
+                    card_urls = [card['url'] for card in page_cards]
+                # 与 crawl 一致只跟进一层：详情页只从分类页中取
+                if self.follow_details and url in page_urls:
+                    return [detail_url for detail_url in self.detail_page_urls({'url': card_url} for card_url in card_urls)
+                            if detail_url not in page_urls]
+                return []
+
+            page_urls = self.category_page_urls(categories)
+            detail_urls = handle_page(self.base_url, home_html)
+            items = [(url, PRIORITY_CATEGORY) for url in page_urls if url != self.base_url]
+            items += [(url, PRIORITY_DETAIL) for url in detail_urls]
+            self.fetch_all(items, on_page=handle_page)
+
+            added, changed, removed = index.diff(parsed_cards)
+            delta = {
+                'crawled_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'pages': stats,
+                'added': added,
+                'changed': changed,
+                'removed': removed
+            }
+            with open(self.output_dir / 'delta.json', 'w', encoding='utf-8') as f:
+                json.dump(delta, f, ensure_ascii=False, indent=2)
+            index.save()
+            logging.info(f"增量爬取完成：{stats['total']} 个页面中重新解析 {stats['parsed']} 个，"
+                         f"新增 {len(added)}、修改 {len(changed)}、删除 {len(removed)} 个工具")
 
     def save_results(self, results):
         """保存爬取结果"""
@@ -153,54 +1007,42 @@ class AIBotCrawler:
 
     def generate_html_report(self, results):
         """生成HTML报告"""
-        html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>AI工具导航</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 20px; }
-                .category { margin-bottom: 30px; }
-                .subcategory { margin: 20px 0; }
-                .item { margin: 10px 0; padding: 10px; border: 1px solid #ddd; }
-                .tag { background: #eee; padding: 2px 5px; margin-right: 5px; }
-            </style>
-        </head>
-        <body>
-        """
-
-        for category in results:
-            html += f"<div class='category'>"
-            html += f"<h2>{category['name']}</h2>"
-            
-            for subcategory in category['subcategories']:
-                html += f"<div class='subcategory'>"
-                html += f"<h3>{subcategory['name']}</h3>"
-                
-                if subcategory['items']:
-                    for item in subcategory['items']:
-                        html += f"<div class='item'>"
-                        html += f"<h4>{item['title']}</h4>"
-                        html += f"<p>{item['description']}</p>"
-                        if item['url']:
-                            html += f"<p><a href='{item['url']}' target='_blank'>访问链接</a></p>"
-                        if item['tags']:
-                            html += "<p>"
-                            for tag in item['tags']:
-                                html += f"<span class='tag'>{tag}</span>"
-                            html += "</p>"
-                        html += "</div>"
-                
-                html += "</div>"
-            
-            html += "</div>"
+        self.write_report(self.iter_records(results))
 
-        html += "</body></html>"
+    def iter_records(self, results):
+        """把 crawl 的结果结构展开为逐条记录，与 results.ndjson 的格式一致"""
+        for category_data in results:
+            for category in category_data['categories']:
+                yield {'type': 'category', **category}
+            for card in category_data['subcategories'] or []:
+                yield {'type': 'card', **card}
 
-        with open(self.output_dir / 'report.html', 'w', encoding='utf-8') as f:
-            f.write(html)
+    def write_report(self, records):
+        """逐条写出 HTML 报告，records 可以是 results.ndjson 的记录流"""
+        writer = HtmlReportWriter(self.output_dir, self.base_url, page_size=self.report_page_size)
+        for record in records:
+            writer.write(record)
+        pages = writer.close()
+        logging.info(f"HTML 报告已生成，共 {pages} 页")
 
 if __name__ == "__main__":
-    crawler = AIBotCrawler()
-    crawler.crawl()
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description='ai-bot.cn 工具导航爬虫')
+    arg_parser.add_argument('--parser', choices=sorted(PARSERS), default='lxml', help='HTML 解析实现')
+    arg_parser.add_argument('--stream', action='store_true', help='边解析边写入 output/results.ndjson')
+    arg_parser.add_argument('--resume', action='store_true', help='流式爬取时从上次的检查点继续')
+    arg_parser.add_argument('--incremental', action='store_true', help='只解析有变化的页面，变更写入 output/delta.json')
+    arg_parser.add_argument('--follow-details', action='store_true', help='并发抓取分类页中的站内详情页')
+    arg_parser.add_argument('--report-page-size', type=int, help='HTML 报告每页的工具数，默认不分页')
+    arg_parser.add_argument('--compare-parsers', metavar='HTML_FILE', help='用本地 HTML 文件对比各解析实现的耗时')
+    args = arg_parser.parse_args()
+
+    crawler = AIBotCrawler(follow_details=args.follow_details, parser=args.parser,
+                           report_page_size=args.report_page_size)
+    if args.compare_parsers:
+        compare_parsers(Path(args.compare_parsers).read_text(encoding='utf-8'))
+    elif args.incremental:
+        crawler.crawl_incremental()
+    elif args.stream:
+        crawler.crawl_stream(resume=args.resume)
+    else:
+        crawler.crawl()
\ No newline at end of file
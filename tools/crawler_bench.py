@@ -0,0 +1,150 @@
+"""
+离线回放基准测试：用本地 HTML 文件代替网络请求，测量爬虫的解析性能。
+
+用法（在仓库根目录执行）：
+    python tools/crawler_bench.py --fixture page_structure.html --pages 20 --parser all
+
+输出每个解析实现的 pages/sec、cards/sec、峰值内存以及各阶段耗时。
+每个解析实现在单独的子进程中测试，进程最大 RSS 不受前一个解析实现影响。
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from crawler import AIBotCrawler, PARSERS, etree
+
+
+class ReplayCrawler(AIBotCrawler):
+    """get_page 从本地文件返回页面内容的爬虫，不访问网络"""
+
+    def __init__(self, home_html, parser, fixtures=None):
+        super().__init__(use_cache=False, parser=parser)
+        self.home_html = home_html
+        self.fixtures = fixtures or {}
+
+    def get_page(self, url):
+        """按 url 返回回放内容，未登记的页面返回首页内容"""
+        return self.fixtures.get(url, self.home_html)
+
+
+def replay(crawler, page_urls):
+    """回放一次完整的解析流程，返回各阶段耗时和解析数量"""
+    timings = {}
+
+    # 每个阶段使用新的解析器实例，避免 lxml 复用上一阶段构建的首页文档树
+    crawler.parser = PARSERS[crawler.parser.name]()
+    start = time.perf_counter()
+    categories = crawler.parse_categories()
+    timings['parse_categories'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pages = {url: crawler.get_page(url) for url in page_urls}
+    timings['fetch'] = time.perf_counter() - start
+
+    crawler.parser = PARSERS[crawler.parser.name]()
+    start = time.perf_counter()
+    card_count = 0
+    for url, html in pages.items():
+        card_count += len(crawler.parse_item_detail(url, html=html) or [])
+    timings['parse_item_detail'] = time.perf_counter() - start
+
+    return timings, len(categories), card_count
+
+
+def configure_logging():
+    """先配置日志，避免爬虫把逐条分类信息写进 crawler.log"""
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def run_benchmark(parser, home_html, page_count, rounds):
+    """对指定解析实现执行多轮回放，统计吞吐量和峰值内存"""
+    crawler = ReplayCrawler(home_html, parser)
+    page_urls = [crawler.base_url] + [f"{crawler.base_url}?replay={i}" for i in range(1, page_count)]
+    # 其余页面使用内容不同的副本，保证每个页面都真正解析一次
+    crawler.fixtures = {url: f"{home_html}\n<!-- {url} -->" for url in page_urls[1:]}
+
+    totals = {}
+    category_count = card_count = 0
+    for _ in range(rounds):
+        timings, category_count, card_count = replay(crawler, page_urls)
+        for phase, seconds in timings.items():
+            totals[phase] = totals.get(phase, 0.0) + seconds
+    phases = {phase: seconds / rounds for phase, seconds in totals.items()}
+    elapsed = sum(phases.values())
+
+    # 单独跑一轮测量峰值内存，避免 tracemalloc 的开销影响计时
+    tracemalloc.start()
+    replay(crawler, page_urls)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # tracemalloc 只统计 Python 对象，lxml 等 C 扩展的内存需看进程 RSS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None
+
+    return {
+        'parser': parser,
+        'pages': len(page_urls),
+        'categories': category_count,
+        'cards': card_count,
+        'seconds': elapsed,
+        'pages_per_sec': len(page_urls) / elapsed,
+        'cards_per_sec': card_count / elapsed,
+        'peak_memory_mb': peak / 1024 / 1024,
+        'max_rss_mb': max_rss,
+        'phases': phases,
+    }
+
+
+def print_report(result):
+    """打印单个解析实现的测试结果"""
+    print(f"[{result['parser']}] {result['pages']} 页，分类 {result['categories']} 个，卡片 {result['cards']} 个")
+    print(f"  总耗时 {result['seconds']:.3f} s，{result['pages_per_sec']:.1f} pages/sec，"
+          f"{result['cards_per_sec']:.0f} cards/sec，Python 峰值内存 {result['peak_memory_mb']:.1f} MB")
+    if result['max_rss_mb'] is not None:
+        print(f"  进程最大 RSS {result['max_rss_mb']:.1f} MB")
+    for phase, seconds in result['phases'].items():
+        print(f"  {phase:<18} {seconds * 1000:9.1f} ms")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='爬虫离线回放基准测试')
+    arg_parser.add_argument('--fixture', default='page_structure.html', help='作为首页回放的 HTML 文件')
+    arg_parser.add_argument('--pages', type=int, default=10, help='每轮回放的页面数')
+    arg_parser.add_argument('--rounds', type=int, default=3, help='计时轮数')
+    arg_parser.add_argument('--parser', choices=sorted(PARSERS) + ['all'], default='all', help='要测试的解析实现')
+    arg_parser.add_argument('--json', metavar='FILE', help='将结果写入 JSON 文件')
+    args = arg_parser.parse_args()
+
+    configure_logging()
+
+    home_html = Path(args.fixture).read_text(encoding='utf-8')
+    parsers = sorted(PARSERS) if args.parser == 'all' else [args.parser]
+    if etree is None and 'lxml' in parsers:
+        print("未安装 lxml，跳过 lxml 解析器")
+        parsers.remove('lxml')
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for parser in parsers:
+        # 每个解析实现在新的进程中测试，进程最大 RSS 只反映该解析实现
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=configure_logging) as executor:
+            result = executor.submit(run_benchmark, parser, home_html, max(1, args.pages), max(1, args.rounds)).result()
+        print_report(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,23 @@
 import os
 import pymysql
 import openpyxl
-import sys
+import argparse
+import hashlib
+import multiprocessing
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache, partial
+from itertools import islice
+from operator import itemgetter
 
 # 数据库连接配置
 MYSQL_CONFIG = {
@@ -38,85 +54,972 @@ COLUMN_FIELD_MAP = {
      # '月份': 'tmonth',  # 由参数传入
 }
 
+# 按类型转换的字段，其余字段按文本写入
+DATE_FIELDS = ('submittest', 'plandate', 'actualdate')
+DECIMAL_FIELDS = ('workhours', 'level', 'speed', 'quality', 'attitude')
+INTEGER_FIELDS = ('bugs',)
+
+# 日期字段接受的文本格式
+DATE_FORMATS = ('%Y/%m/%d', '%Y-%m-%d', '%Y.%m.%d', '%Y/%m/%d %H:%M:%S', '%Y-%m-%d %H:%M:%S')
+
+# 每列缓存的已转换值个数上限
+CONVERTED_CACHE_SIZE = 10000
+
+# 每批插入的行数，每批一个事务
+CHUNK_SIZE = 1000
+
+# 解析好、等待插入的批数上限，限制内存占用
+QUEUE_CHUNKS = 4
+
+# 插入引擎：insert 为逐条 executemany，multi 为按 max_allowed_packet 拼接的多行 INSERT，
+# bulk 为写临时 TSV 文件后 LOAD DATA LOCAL INFILE，服务器不允许时自动改用 multi。
+# 非 upsert 模式下 LOAD DATA LOCAL 遇到唯一键重复的行只跳过并计数，其他引擎则报错并回滚该批
+ENGINES = ('insert', 'multi', 'bulk')
+
+# 服务器或客户端不允许 LOAD DATA LOCAL INFILE 时的错误码
+LOCAL_INFILE_ERRORS = (1148, 2068, 3948)
+
+# 多行 INSERT 语句最多使用 max_allowed_packet 的比例，留出协议开销
+PACKET_USAGE = 0.9
+
+# LOAD DATA 默认格式下需要转义的字符
+TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+# bulk 引擎 upsert 时先导入的会话级临时表，再按唯一键合并到 workorder
+LOAD_TABLE = 'workorder_load'
+
+# upsert 模式需要的表结构：保存行哈希的字段和 orderno + tmonth 唯一索引
+UPSERT_SCHEMA = {
+    'rowhash': "ALTER TABLE workorder ADD COLUMN rowhash CHAR(40) NULL",
+    'uk_orderno_tmonth': "ALTER TABLE workorder ADD UNIQUE KEY uk_orderno_tmonth (orderno, tmonth)",
+}
+
+# upsert 时不更新的键字段
+UPSERT_KEYS = ('orderno', 'tmonth')
+
+# 存储后端：mysql 写入 MYSQL_CONFIG 指定的库，sqlite 写入本地文件，用于离线测试和压测
+BACKENDS = ('mysql', 'sqlite')
+SQLITE_PATH = os.path.join('output', 'workorder.sqlite3')
+
+# 多文件导入时写入数据库的线程数，连接池大小应不小于该值
+WRITERS = 2
+
+# 连接池大小；空闲超过 PING_INTERVAL 秒的连接在取出时先 ping 一次
+POOL_SIZE = 4
+PING_INTERVAL = 30
+
 """
 此模块用于将Excel文件中的数据插入到MySQL数据库的workorder表中。
 
 主要功能包括：
 - 从Excel文件中读取数据，并根据预定义的列名与数据库字段名的映射关系进行转换。
-- 将转换后的数据插入到数据库中。
+- 日期、分值等字段在写入前转换为对应类型，无效的行直接跳过并输出所在行号。
+- 以只读模式逐行读取，按批插入到数据库中，每批一个事务，内存占用不随文件大小增长。
+- 解析与插入在不同线程中同时进行；导入多个文件时由多个进程并行解析，多个写入线程同时插入。
+- 通过连接池复用数据库连接，批量导入目录时不必为每个文件重新连接。
+- 可选 LOAD DATA LOCAL INFILE 或多行 INSERT 批量写入，并输出每秒插入行数，便于选择引擎。
+- upsert 模式按 orderno + tmonth 更新已有工单，行哈希未变化的工单直接跳过，重复导入同一个月不会产生重复数据。
+- 存储后端可替换：MySQL、本地 SQLite 文件，以及只校验计数、不写入的 dry-run。
 - 支持批量导入指定目录下的所有Excel文件。
 - 提供自定义的月份参数以便插入到数据库中。
 
-函数：
-- insert_to_workorder(data, fields): 将数据插入到workorder表中。
-- read_excel_and_insert(file_path, tmonth=None): 从Excel文件中读取数据并插入到数据库。
-- batch_import_from_dir(dir_path, tmonth=None): 批量导入指定目录下的Excel文件。
-- get_workorder_fields(): 获取workorder表的字段信息。
+类和函数：
+- Backend: 存储后端的基类，提供 acquire/release/connection/close 取还连接；子类实现
+  inserter(engine, upsert) 返回写入一批数据的函数，row_hashes(tmonth) 返回已导入工单的行哈希，
+  check_schema(apply) 检查 upsert 模式需要的表结构。
+- MySQLBackend: MySQL 存储后端（连接池，旧名称 ConnectionPool），get_backend() 返回按 MYSQL_CONFIG 创建的默认后端。
+- SQLiteBackend: 写入本地 SQLite 文件的存储后端，表结构与 workorder 表相同。
+- DryRunBackend: 只校验、计数而不写入的存储后端。
+- RowProjector: 按表头预先编译的行投影，取出映射的列并转换类型。
+- RowHashFilter: 记录某个月已导入工单的行哈希，过滤掉未变化的行。
+- insert_to_workorder(data, fields, backend=None): 将数据插入到workorder表中。
+- insert_chunks(chunks, fields, backend=None, engine='insert'): 在后台线程中逐批插入数据。
+- open_records(file_path, tmonth=None): 只读打开Excel，返回字段列表和映射后的行记录。
+- read_excel_and_insert(file_path, tmonth=None, chunk_size=CHUNK_SIZE, backend=None, engine='insert', row_filter=None): 从Excel文件中读取数据并插入到数据库。
+- pipeline_import(file_paths, tmonth=None, chunk_size=CHUNK_SIZE, backend=None, engine='insert', row_filter=None, workers=None, writers=WRITERS): 多进程解析、多线程写入多个文件。
+- batch_import_from_dir(dir_path, tmonth=None, chunk_size=CHUNK_SIZE, backend=None, engine='insert', upsert=False, workers=None, writers=WRITERS): 批量导入指定目录下的Excel文件。
+- check_upsert_schema(backend=None, apply=False): 检查并补齐 upsert 模式需要的表结构。
+- get_workorder_fields(backend=None): 获取workorder表的字段信息。
 """
 
-def insert_to_workorder(data, fields):
+class Backend(ABC):
+    """存储后端的基类：管理最多 size 个连接的复用，子类负责建立连接、写入和检查表结构"""
+
+    # 出现这些异常时连接可能已损坏，归还时直接关闭
+    connection_errors = ()
+
+    def __init__(self, size=POOL_SIZE):
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.created = 0
+        self.closed = False
+
+    @abstractmethod
+    def connect(self):
+        """建立一个新连接"""
+
+    def healthy(self, conn, idle_since):
+        return True
+
+    def discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=None):
+        """取出一个可用连接，没有空闲连接时新建，连接数已满时等待"""
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError('等待数据库连接超时')
+        try:
+            while True:
+                try:
+                    conn, idle_since = self.idle.get_nowait()
+                except queue.Empty:
+                    self.created += 1
+                    return self.connect()
+                if self.healthy(conn, idle_since):
+                    return conn
+                self.discard(conn)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        """归还连接，连接已损坏或连接池已关闭时直接关闭"""
+        if broken or self.closed:
+            self.discard(conn)
+        else:
+            self.idle.put((conn, time.monotonic()))
+        self.slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except self.connection_errors:
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    @abstractmethod
+    def inserter(self, engine='insert', upsert=False):
+        """返回按引擎写入一批数据的函数 insert(conn, data, fields)，其返回值为被跳过的行数或 None"""
+
+    @abstractmethod
+    def row_hashes(self, tmonth):
+        """返回某个月已导入工单的 {orderno: rowhash}"""
+
+    @abstractmethod
+    def check_schema(self, apply=False):
+        """检查 upsert 模式需要的表结构，返回仍缺少的建表语句"""
+
+    def close(self):
+        """关闭所有空闲连接，之后归还的连接也会被关闭"""
+        self.closed = True
+        while True:
+            try:
+                conn, _ = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+
+class MySQLBackend(Backend):
+    """pymysql 连接池：连接在一次运行中复用，最多同时存在 size 个，取出时检查连接是否可用"""
+
+    connection_errors = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+    def __init__(self, config=None, size=POOL_SIZE, ping_interval=PING_INTERVAL):
+        super().__init__(size)
+        self.config = dict(config or MYSQL_CONFIG)
+        self.ping_interval = ping_interval
+        # 服务器是否允许 LOAD DATA LOCAL INFILE，第一次批量导入时确定
+        self.load_data = None
+
+    def connect(self):
+        return pymysql.connect(**self.config)
+
+    def healthy(self, conn, idle_since):
+        """刚用过的连接直接复用，空闲较久的连接 ping 一次确认仍然可用"""
+        if time.monotonic() - idle_since < self.ping_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def inserter(self, engine='insert', upsert=False):
+        return make_inserter(engine, self, upsert)
+
+    def row_hashes(self, tmonth):
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT orderno, rowhash FROM workorder WHERE tmonth = %s", (tmonth,))
+                return {str(orderno): rowhash for orderno, rowhash in cursor.fetchall()}
+
+    def check_schema(self, apply=False):
+        return [UPSERT_SCHEMA[name] for name in check_upsert_schema(self, apply)]
+
+
+# 旧名称，MySQL 后端原先就叫连接池
+ConnectionPool = MySQLBackend
+
+
+def sqlite_schema():
+    """按字段类型生成与 workorder 表对应的 SQLite 建表语句"""
+    columns = []
+    for field in list(COLUMN_FIELD_MAP.values()) + ['tmonth', 'rowhash']:
+        if field in DATE_FIELDS:
+            columns.append(f"{field} DATE")
+        elif field in DECIMAL_FIELDS:
+            columns.append(f"{field} NUMERIC")
+        elif field in INTEGER_FIELDS:
+            columns.append(f"{field} INTEGER")
+        else:
+            columns.append(f"{field} TEXT")
+    return f"CREATE TABLE IF NOT EXISTS workorder (id INTEGER PRIMARY KEY AUTOINCREMENT, {', '.join(columns)})"
+
+
+def sqlite_value(value):
+    # SQLite 没有日期和定点数类型，按 MySQL 也接受的文本保存
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def sqlite_insert_rows(conn, data, fields, upsert=False):
+    """用 executemany 在一个事务中写入 SQLite，失败时回滚"""
+    sql = f"INSERT INTO workorder ({','.join(fields)}) VALUES ({','.join(['?'] * len(fields))})"
+    if upsert:
+        updates = ','.join(f"{field}=excluded.{field}" for field in fields if field not in UPSERT_KEYS)
+        sql += f" ON CONFLICT (orderno, tmonth) DO UPDATE SET {updates}"
+    # 只有日期和数值字段需要转换
+    typed = {index for index, field in enumerate(fields) if field in DATE_FIELDS or field in DECIMAL_FIELDS}
+    if typed:
+        data = [tuple(sqlite_value(value) if index in typed else value for index, value in enumerate(record))
+                for record in data]
+    try:
+        conn.executemany(sql, data)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+class SQLiteBackend(Backend):
+    """写入本地 SQLite 文件的存储后端，不需要 MySQL 服务器即可测试和压测导入"""
+
+    connection_errors = (sqlite3.OperationalError, sqlite3.InterfaceError, sqlite3.ProgrammingError)
+
+    # upsert 模式需要的唯一索引
+    UNIQUE_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS uk_orderno_tmonth ON workorder (orderno, tmonth)"
+
+    def __init__(self, path=SQLITE_PATH, size=POOL_SIZE):
+        super().__init__(size)
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connection() as conn:
+            # WAL 模式下写入线程提交时不阻塞其他连接的读取
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(sqlite_schema())
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def inserter(self, engine='insert', upsert=False):
+        """SQLite 只用 executemany 写入，engine 不起作用"""
+        return partial(sqlite_insert_rows, upsert=upsert)
+
+    def row_hashes(self, tmonth):
+        with self.connection() as conn:
+            rows = conn.execute("SELECT orderno, rowhash FROM workorder WHERE tmonth = ?", (tmonth,))
+            return {str(orderno): rowhash for orderno, rowhash in rows}
+
+    def check_schema(self, apply=False):
+        """本地文件的表由后端创建，缺少唯一索引时直接创建；已有重复工单无法创建时返回建索引语句"""
+        with self.connection() as conn:
+            try:
+                conn.execute(self.UNIQUE_INDEX)
+            except sqlite3.IntegrityError:
+                return [self.UNIQUE_INDEX]
+        return []
+
+
+def dry_run_rows(conn, data, fields):
+    """检查字段和每行的列数，不写入任何数据"""
+    unknown = set(fields) - set(COLUMN_FIELD_MAP.values()) - {'tmonth', 'rowhash'}
+    if unknown:
+        raise ValueError(f"workorder 表中没有字段：{sorted(unknown)}")
+    for record in data:
+        if len(record) != len(fields):
+            raise ValueError(f"数据列数 {len(record)} 与字段数 {len(fields)} 不一致：{record!r}")
+
+
+class DryRunBackend(Backend):
+    """只校验、计数不写入的存储后端，用于检查 Excel 数据和单独测量解析耗时"""
+
+    def connect(self):
+        # 不需要真实连接，返回占位对象
+        return object()
+
+    def inserter(self, engine='insert', upsert=False):
+        return dry_run_rows
+
+    def row_hashes(self, tmonth):
+        # 不读取已有数据，所有行都按新增处理
+        return {}
+
+    def check_schema(self, apply=False):
+        return []
+
+
+default_backend = None
+default_backend_lock = threading.Lock()
+
+def get_backend():
+    """返回按 MYSQL_CONFIG 创建的默认 MySQL 后端，进程内共用"""
+    global default_backend
+    with default_backend_lock:
+        if default_backend is None:
+            default_backend = MySQLBackend(MYSQL_CONFIG, POOL_SIZE)
+        return default_backend
+
+
+def upsert_clause(fields):
+    """orderno + tmonth 已存在时更新其他字段的 ON DUPLICATE KEY UPDATE 子句"""
+    updates = ','.join(f"{field}=VALUES({field})" for field in fields if field not in UPSERT_KEYS)
+    return f" ON DUPLICATE KEY UPDATE {updates}"
+
+
+def insert_rows(conn, data, fields, upsert=False):
+    """在一个事务中插入一批数据，失败时回滚"""
+    placeholders = ','.join(['%s'] * len(fields))
+    sql = f"INSERT INTO workorder ({','.join(fields)}) VALUES ({placeholders})"
+    if upsert:
+        sql += upsert_clause(fields)
+    try:
+        with conn.cursor() as cursor:
+            cursor.executemany(sql, data)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+max_packets = weakref.WeakKeyDictionary()
+
+def server_max_packet(conn):
+    """查询服务器的 max_allowed_packet，每个连接只查询一次"""
+    size = max_packets.get(conn)
+    if size is None:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT @@max_allowed_packet")
+            size = max_packets[conn] = int(cursor.fetchone()[0])
+    return size
+
+
+def multi_insert_rows(conn, data, fields, upsert=False):
+    """拼接多行 INSERT，每条语句不超过 max_allowed_packet，一批数据在同一个事务中"""
+    prefix = f"INSERT INTO workorder ({','.join(fields)}) VALUES "
+    suffix = upsert_clause(fields) if upsert else ''
+    limit = int(server_max_packet(conn) * PACKET_USAGE)
+    try:
+        with conn.cursor() as cursor:
+            values = []
+            size = len(prefix) + len(suffix)
+            for record in data:
+                value = '(' + ','.join(conn.escape(item) for item in record) + ')'
+                # 按 utf8mb4 最坏情况估算字节数
+                if values and size + len(value) * 4 + 1 > limit:
+                    cursor.execute(prefix + ','.join(values) + suffix)
+                    values = []
+                    size = len(prefix) + len(suffix)
+                values.append(value)
+                size += len(value) * 4 + 1
+            if values:
+                cursor.execute(prefix + ','.join(values) + suffix)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def tsv_value(value):
+    """把单个值转换为 LOAD DATA 默认格式的字段"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return str(value).translate(TSV_ESCAPES)
+
+
+def load_data_rows(conn, data, fields, upsert=False):
+    """把一批数据写入临时 TSV 文件，再用 LOAD DATA LOCAL INFILE 导入，返回因唯一键重复被跳过的行数；
+    upsert 时先导入临时表，再用 ON DUPLICATE KEY UPDATE 合并，与其他引擎一样保留已有工单的 id 和未映射的字段"""
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.tsv', delete=False) as f:
+        for record in data:
+            f.write('\t'.join(tsv_value(item) for item in record))
+            f.write('\n')
+    columns = ','.join(fields)
+    table = LOAD_TABLE if upsert else 'workorder'
+    sql = (f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+           f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({columns})")
+    try:
+        with conn.cursor() as cursor:
+            if upsert:
+                # 临时表只有要导入的字段、没有索引，批内重复的工单按顺序合并，后出现的行生效
+                cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {LOAD_TABLE}")
+                cursor.execute(f"CREATE TEMPORARY TABLE {LOAD_TABLE} SELECT {columns} FROM workorder LIMIT 0")
+            cursor.execute(sql, (f.name,))
+            # LOCAL 导入遇到唯一键重复的行只产生警告并跳过，不像其他引擎那样报错
+            skipped = len(data) - cursor.rowcount
+            if upsert:
+                cursor.execute(f"INSERT INTO workorder ({columns}) SELECT {columns} FROM {LOAD_TABLE}"
+                               f"{upsert_clause(fields)}")
+                cursor.execute(f"DROP TEMPORARY TABLE {LOAD_TABLE}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        os.remove(f.name)
+    return skipped
+
+
+def make_inserter(engine, backend, upsert=False):
+    """返回按引擎插入一批数据的函数；bulk 引擎在不允许 LOCAL INFILE 时改用多行 INSERT，结果记录在后端上。
+    插入函数返回因唯一键重复被跳过的行数，只有 LOAD DATA 会跳过，其他引擎返回 None"""
+    if engine == 'insert':
+        return partial(insert_rows, upsert=upsert)
+    if engine == 'multi':
+        return partial(multi_insert_rows, upsert=upsert)
+    if engine != 'bulk':
+        raise ValueError(f"未知的插入引擎: {engine}")
+
+    def insert(conn, data, fields):
+        if backend.load_data is None and not backend.config.get('local_infile'):
+            backend.load_data = False
+            print("数据库连接未开启 local_infile，改用多行 INSERT")
+        if backend.load_data is not False:
+            try:
+                skipped = load_data_rows(conn, data, fields, upsert)
+                backend.load_data = True
+                return skipped
+            except pymysql.err.MySQLError as e:
+                if not e.args or e.args[0] not in LOCAL_INFILE_ERRORS:
+                    raise
+                backend.load_data = False
+                print(f"服务器不允许 LOAD DATA LOCAL INFILE：{e.args[-1]}，改用多行 INSERT")
+        multi_insert_rows(conn, data, fields, upsert)
+    return insert
+
+
+@lru_cache(maxsize=4096)
+def parse_date_text(text):
+    """解析文本日期，同一个月的工单日期大量重复，结果缓存"""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"无效的日期：{text!r}")
+
+
+def to_date(value):
+    if value is None or isinstance(value, date):
+        # datetime 是 date 的子类，只保留日期部分
+        return value.date() if isinstance(value, datetime) else value
+    text = str(value).strip()
+    return parse_date_text(text) if text else None
+
+
+def to_decimal(value):
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return Decimal(value)
+    # 浮点数按最短表示转换，避免 0.1 变成 0.1000000000000000055511151231257827
+    text = repr(value) if isinstance(value, float) else str(value).strip()
+    if not text:
+        return None
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"无效的数值：{value!r}") from None
+    if not number.is_finite():
+        raise ValueError(f"无效的数值：{value!r}")
+    return number
+
+
+def to_integer(value):
+    number = to_decimal(value)
+    if number is None:
+        return None
+    if number != number.to_integral_value():
+        raise ValueError(f"无效的整数：{value!r}")
+    return int(number)
+
+
+def to_text(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+# 字段对应的类型转换函数，未列出的字段按文本处理
+FIELD_CONVERTERS = dict([(field, to_date) for field in DATE_FIELDS] +
+                        [(field, to_decimal) for field in DECIMAL_FIELDS] +
+                        [(field, to_integer) for field in INTEGER_FIELDS])
+
+
+TEXT_TYPES = {str, type(None)}
+
+
+class ConvertedValues(dict):
+    """缓存一列中已转换过的值，同一列的日期、分值大量重复，命中时不再调用转换函数"""
+
+    def __init__(self, convert):
+        super().__init__()
+        self.convert = convert
+
+    def __missing__(self, value):
+        if len(self) >= CONVERTED_CACHE_SIZE:
+            self.clear()
+        result = self[value] = self.convert(value)
+        return result
+
+
+def text_column(values):
+    """文本列中的数字等非文本值转换为字符串，整列都是文本时原样返回"""
+    if set(map(type, values)) <= TEXT_TYPES:
+        return values
+    return [value if value is None or value.__class__ is str else str(value) for value in values]
+
+
+class RowProjector:
+    """按表头编译的行投影：用 itemgetter 一次取出映射的列，再按列批量转换类型，无效的行计入 rejected"""
+
+    def __init__(self, header, tmonth=None, chunk_size=CHUNK_SIZE):
+        columns = [(COLUMN_FIELD_MAP[col], header.index(col), col) for col in COLUMN_FIELD_MAP if col in header]
+        self.fields = [field for field, _, _ in columns]
+        self.labels = [label for _, _, label in columns]
+        indices = [index for _, index, _ in columns]
+        self.width = max(indices) + 1 if indices else 0
+        # 只有一列时 itemgetter 返回单个值，统一包装为元组
+        getter = itemgetter(*indices) if indices else (lambda row: ())
+        self.getter = getter if len(indices) != 1 else (lambda row: (getter(row),))
+        self.converters = [ConvertedValues(FIELD_CONVERTERS[field]) if field in FIELD_CONVERTERS else None
+                           for field in self.fields]
+        self.suffix = (tmonth,) if tmonth is not None else ()
+        if tmonth is not None:
+            self.fields.append('tmonth')
+        self.chunk_size = chunk_size
+        self.rejected = 0
+
+    def convert_columns(self, records):
+        """按列转换一批记录，有无效值时抛出 ValueError"""
+        columns = list(zip(*records))
+        for position, converted in enumerate(self.converters):
+            if converted is None:
+                columns[position] = text_column(columns[position])
+            else:
+                columns[position] = list(map(converted.__getitem__, columns[position]))
+        if self.suffix:
+            columns.append(self.suffix * len(records))
+        return list(zip(*columns))
+
+    def convert_rows(self, records, numbers):
+        """逐行检查，跳过并提示含有无效值的行后再按列转换"""
+        valid = []
+        for number, record in zip(numbers, records):
+            for position, converted in enumerate(self.converters):
+                if converted is None:
+                    continue
+                try:
+                    converted[record[position]]
+                except ValueError as e:
+                    self.rejected += 1
+                    print(f"第 {number} 行“{self.labels[position]}”{e}，已跳过该行。")
+                    break
+            else:
+                valid.append(record)
+        return self.convert_columns(valid) if valid else []
+
+    def __call__(self, rows, first_row=2):
+        """转换行迭代器，first_row 为第一行在工作表中的行号，用于提示无效数据的位置"""
+        getter = self.getter
+        width = self.width
+        rows = enumerate(rows, first_row)
+        while True:
+            batch = list(islice(rows, self.chunk_size))
+            if not batch:
+                return
+            records = []
+            numbers = []
+            for number, row in batch:
+                # 只读模式下末尾可能带有空行
+                if row.count(None) == len(row):
+                    continue
+                if len(row) < width:
+                    row = row + (None,) * (width - len(row))
+                records.append(getter(row))
+                numbers.append(number)
+            if not records:
+                continue
+            try:
+                converted = self.convert_columns(records)
+            except ValueError:
+                # 整批转换失败时逐行转换，找出无效的行
+                converted = self.convert_rows(records, numbers)
+            yield from converted
+
+
+def row_hash(record):
+    """计算一行数据的哈希，用于判断工单内容是否变化"""
+    return hashlib.sha1('\t'.join(tsv_value(item) for item in record).encode('utf-8')).hexdigest()
+
+
+class RowHashFilter:
+    """按 orderno 记录某个月已导入工单的行哈希，只放行新增或内容有变化的行"""
+
+    def __init__(self, backend, tmonth):
+        self.tmonth = tmonth
+        self.skipped = 0
+        self.rejected = 0
+        self.hashes = backend.row_hashes(tmonth)
+
+    def changed(self, records, orderno_index):
+        """过滤掉哈希未变化的行和没有工单号的行，放行的行在末尾追加 rowhash 字段"""
+        for record in records:
+            orderno = record[orderno_index]
+            # 没有工单号的行无法按唯一键去重，重复导入会插入重复数据，按无效行处理
+            if orderno is None or str(orderno).strip() == '':
+                self.rejected += 1
+                continue
+            digest = row_hash(record)
+            key = str(orderno)
+            if self.hashes.get(key) == digest:
+                self.skipped += 1
+                continue
+            self.hashes[key] = digest
+            yield record + (digest,)
+
+
+def insert_to_workorder(data, fields, backend=None):
     if not data:
         print('没有可插入的数据。')
         return
-    conn = pymysql.connect(**MYSQL_CONFIG)
-    cursor = conn.cursor()
-    placeholders = ','.join(['%s'] * len(fields))
-    sql = f"INSERT INTO workorder ({','.join(fields)}) VALUES ({placeholders})"
-    cursor.executemany(sql, data)
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-
-def read_excel_and_insert(file_path, tmonth=None):
-    wb = openpyxl.load_workbook(file_path)
-    ws = wb.active
-    rows = list(ws.iter_rows(values_only=True))
-    header = [str(cell).strip() for cell in rows[0]]
-    print(f"Excel表头如下：{header}")
+    with (backend or get_backend()).connection() as conn:
+        insert_rows(conn, data, fields)
+
+
+def insert_chunks(chunks, fields, backend=None, engine='insert', upsert=False):
+    """在后台线程中逐批插入，每批一个事务；插入上一批的同时解析下一批，返回插入的行数"""
+    backend = backend or get_backend()
+    insert = backend.inserter(engine, upsert)
+    pending = queue.Queue(maxsize=QUEUE_CHUNKS)
+    state = {'rows': 0, 'duplicates': 0, 'error': None}
+
+    def writer():
+        conn = None
+        broken = False
+        while True:
+            chunk = pending.get()
+            if chunk is None:
+                break
+            # 出错后只取出剩余的批次，等待解析线程停止
+            if state['error'] is not None:
+                continue
+            try:
+                if conn is None:
+                    conn = backend.acquire()
+                skipped = insert(conn, chunk, fields) or 0
+                state['rows'] += len(chunk) - skipped
+                state['duplicates'] += skipped
+            except Exception as e:
+                state['error'] = e
+                broken = isinstance(e, backend.connection_errors)
+        if conn is not None:
+            backend.release(conn, broken)
+
+    thread = threading.Thread(target=writer, name='workorder-writer', daemon=True)
+    thread.start()
+    try:
+        for chunk in chunks:
+            if state['error'] is not None:
+                break
+            pending.put(chunk)
+    finally:
+        pending.put(None)
+        thread.join()
+    if state['error'] is not None:
+        print(f"插入失败，已插入 {state['rows']} 条，失败批次已回滚。")
+        raise state['error']
+    if state['duplicates']:
+        print(f"LOAD DATA 跳过 {state['duplicates']} 条唯一键重复的数据。")
+    return state['rows']
+
+
+def iter_chunks(rows, chunk_size):
+    """把行迭代器切分为每批 chunk_size 行的列表"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def open_records(file_path, tmonth=None):
+    """只读打开Excel，返回字段列表和映射后的行记录迭代器；没有数据时字段列表为 None"""
+    # 只读模式逐行读取，不把整个工作簿载入内存
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+        first_row = next(rows, None)
+        if first_row is None:
+            print('没有可插入的数据。')
+            yield None, iter(())
+            return
+        header = [str(cell).strip() for cell in first_row]
+        print(f"Excel表头如下：{header}")
+        # 只取映射中存在的列
+        projector = RowProjector(header, tmonth)
+        yield projector.fields, projector(rows)
+        if projector.rejected:
+            print(f"{file_path} 中有 {projector.rejected} 行数据无效，未导入。")
+    finally:
+        wb.close()
+
+
+def read_excel_and_insert(file_path, tmonth=None, chunk_size=CHUNK_SIZE, backend=None, engine='insert', row_filter=None):
+    """导入一个文件，返回插入的行数；传入 row_filter 时按 upsert 方式只写入新增或变化的工单"""
     if not COLUMN_FIELD_MAP:
         print("请在 COLUMN_FIELD_MAP 中配置映射关系后再运行！")
-        return
-    # 只取映射中存在的列
-    field_indices = {COLUMN_FIELD_MAP[col]: header.index(col) for col in COLUMN_FIELD_MAP if col in header}
-    fields = list(field_indices.keys())
-    if tmonth is not None:
-        fields.append('tmonth')
-    data = []
-    for row in rows[1:]:
-        record = []
-        for field in field_indices:
-            idx = field_indices[field]
-            record.append(row[idx] if idx is not None else None)
-        if tmonth is not None:
-            record.append(tmonth)
-        data.append(tuple(record))
-    insert_to_workorder(data, fields)
-    print(f"已插入 {len(data)} 条数据到 workorder 表。")
+        return 0
+    start = time.perf_counter()
+    with open_records(file_path, tmonth) as (fields, mapped):
+        if fields is None:
+            return 0
+        if row_filter is not None and 'orderno' not in fields:
+            print("Excel 中没有工单号列，无法按 upsert 方式导入")
+            return 0
+        if row_filter is not None:
+            skipped, rejected = row_filter.skipped, row_filter.rejected
+            mapped = row_filter.changed(mapped, fields.index('orderno'))
+            fields.append('rowhash')
+        count = insert_chunks(iter_chunks(mapped, chunk_size), fields, backend, engine, row_filter is not None)
+    elapsed = time.perf_counter() - start
+    print(f"已插入 {count} 条数据到 workorder 表，用时 {elapsed:.2f} 秒，{count / elapsed:.0f} 行/秒（{engine}）。")
+    if row_filter is not None:
+        print(f"跳过 {row_filter.skipped - skipped} 条未变化的工单。")
+        if row_filter.rejected > rejected:
+            print(f"{file_path} 中有 {row_filter.rejected - rejected} 行没有工单号，无法按 upsert 方式导入，未导入。")
+    return count
+
+
+# 解析进程中放置批次的队列，由 init_parse_worker 设置
+parse_queue = None
+
+
+def init_parse_worker(chunk_queue):
+    global parse_queue
+    parse_queue = chunk_queue
+
+
+def parse_file(file_path, tmonth=None, chunk_size=CHUNK_SIZE, need_orderno=False):
+    """解析进程：把一个文件映射后的行按批放入队列，最后放入解析的总行数，返回解析的行数"""
+    count = 0
+    with open_records(file_path, tmonth) as (fields, mapped):
+        if fields is not None and need_orderno and 'orderno' not in fields:
+            print(f"{file_path} 中没有工单号列，无法按 upsert 方式导入")
+        elif fields is not None:
+            for chunk in iter_chunks(mapped, chunk_size):
+                parse_queue.put((file_path, fields, chunk))
+                count += len(chunk)
+    parse_queue.put((file_path, None, count))
+    return count
+
 
+def pipeline_import(file_paths, tmonth=None, chunk_size=CHUNK_SIZE, backend=None, engine='insert', row_filter=None,
+                    workers=None, writers=WRITERS):
+    """多个进程并行解析文件，解析好的批次经有界队列交给 writers 个写入线程插入，返回插入的行数"""
+    backend = backend or get_backend()
+    insert = backend.inserter(engine, row_filter is not None)
+    workers = workers or min(len(file_paths), os.cpu_count() or 1)
+    # spawn 启动的解析进程不会继承写入线程持有的锁
+    context = multiprocessing.get_context('spawn')
+    chunk_queue = context.Queue(maxsize=QUEUE_CHUNKS * writers)
+    lock = threading.Lock()
+    progress = {path: {'parsed': None, 'rows': 0, 'skipped': 0, 'rejected': 0, 'duplicates': 0} for path in file_paths}
+    state = {'rows': 0, 'duplicates': 0, 'files': 0, 'error': None}
 
-def batch_import_from_dir(dir_path, tmonth=None):
-    for fname in os.listdir(dir_path):
-        if fname.endswith('.xlsx'):
-            file_path = os.path.join(dir_path, fname)
+    def report(path):
+        """文件的所有批次都写入后输出进度，调用时需持有 lock"""
+        entry = progress[path]
+        done = entry['rows'] + entry['skipped'] + entry['rejected'] + entry['duplicates']
+        if entry['parsed'] is None or done < entry['parsed']:
+            return
+        state['files'] += 1
+        skipped = f"，跳过 {entry['skipped']} 条未变化的工单" if row_filter is not None else ''
+        if entry['rejected']:
+            skipped += f"，{entry['rejected']} 行没有工单号未导入"
+        if entry['duplicates']:
+            skipped += f"，{entry['duplicates']} 条唯一键重复被跳过"
+        print(f"[{state['files']}/{len(file_paths)}] {os.path.basename(path)} 已插入 {entry['rows']} 条{skipped}。")
+
+    def writer():
+        conn = None
+        broken = False
+        while True:
+            item = chunk_queue.get()
+            if item is None:
+                break
+            # 出错后只取出剩余的批次，等待解析进程停止
+            if state['error'] is not None:
+                continue
+            path, fields, chunk = item
+            try:
+                if fields is None:
+                    with lock:
+                        progress[path]['parsed'] = chunk
+                        report(path)
+                    continue
+                parsed = len(chunk)
+                rejected = 0
+                if row_filter is not None:
+                    with lock:
+                        rejected = row_filter.rejected
+                        chunk = list(row_filter.changed(chunk, fields.index('orderno')))
+                        rejected = row_filter.rejected - rejected
+                    fields = fields + ['rowhash']
+                duplicates = 0
+                if chunk:
+                    if conn is None:
+                        conn = backend.acquire()
+                    duplicates = insert(conn, chunk, fields) or 0
+                with lock:
+                    state['rows'] += len(chunk) - duplicates
+                    state['duplicates'] += duplicates
+                    progress[path]['rows'] += len(chunk) - duplicates
+                    progress[path]['skipped'] += parsed - len(chunk) - rejected
+                    progress[path]['rejected'] += rejected
+                    progress[path]['duplicates'] += duplicates
+                    report(path)
+            except Exception as e:
+                state['error'] = e
+                broken = isinstance(e, backend.connection_errors)
+        if conn is not None:
+            backend.release(conn, broken)
+
+    threads = [threading.Thread(target=writer, name=f'workorder-writer-{i}', daemon=True) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=init_parse_worker, initargs=(chunk_queue,)) as executor:
+            futures = [executor.submit(parse_file, path, tmonth, chunk_size, row_filter is not None)
+                       for path in file_paths]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    if state['error'] is not None:
+                        break
+            finally:
+                for future in futures:
+                    future.cancel()
+    finally:
+        # 解析进程退出时已把批次全部送入队列，结束标记一定排在最后
+        for _ in threads:
+            chunk_queue.put(None)
+        for thread in threads:
+            thread.join()
+    if state['error'] is not None:
+        print(f"插入失败，已插入 {state['rows']} 条，失败批次已回滚。")
+        raise state['error']
+    if state['duplicates']:
+        print(f"LOAD DATA 跳过 {state['duplicates']} 条唯一键重复的数据。")
+    return state['rows']
+
+
+def batch_import_from_dir(dir_path, tmonth=None, chunk_size=CHUNK_SIZE, backend=None, engine='insert', upsert=False,
+                          workers=None, writers=WRITERS):
+    """导入目录下的所有 xlsx 文件；有多个文件且 workers 不为 1 时解析与写入并行进行"""
+    # 所有文件共用同一个存储后端，只在第一次插入时建立连接
+    backend = backend or get_backend()
+    start = time.perf_counter()
+    total = 0
+    row_filter = None
+    if upsert:
+        if tmonth is None:
+            raise ValueError("upsert 模式需要指定 tmonth")
+        row_filter = RowHashFilter(backend, tmonth)
+    file_paths = [os.path.join(dir_path, fname) for fname in os.listdir(dir_path) if fname.endswith('.xlsx')]
+    if workers == 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
             print(f"正在处理文件: {file_path}")
-            read_excel_and_insert(file_path, tmonth)
+            total += read_excel_and_insert(file_path, tmonth, chunk_size, backend, engine, row_filter)
+    elif COLUMN_FIELD_MAP:
+        print(f"正在并行处理 {len(file_paths)} 个文件")
+        total = pipeline_import(file_paths, tmonth, chunk_size, backend, engine, row_filter, workers, writers)
+    else:
+        print("请在 COLUMN_FIELD_MAP 中配置映射关系后再运行！")
+    elapsed = time.perf_counter() - start
+    print(f"共插入 {total} 条数据，用时 {elapsed:.2f} 秒，{total / elapsed:.0f} 行/秒（{engine}）。")
+    return total
 
 
-def get_workorder_fields():
-    conn = pymysql.connect(**MYSQL_CONFIG)
-    cursor = conn.cursor()
-    cursor.execute("DESC workorder;")
-    fields = [row[0] for row in cursor.fetchall() if row[0] != 'id']
-    cursor.close()
-    conn.close()
+def check_upsert_schema(backend=None, apply=False):
+    """检查 upsert 模式需要的字段和唯一索引，apply 为 True 时补齐，返回仍缺少的部分"""
+    with (backend or get_backend()).connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SHOW COLUMNS FROM workorder LIKE 'rowhash'")
+            has_column = cursor.fetchone() is not None
+            cursor.execute("SHOW INDEX FROM workorder WHERE Non_unique = 0")
+            unique_keys = {}
+            for row in cursor.fetchall():
+                # SHOW INDEX 的第 3、5 列为索引名和字段名
+                unique_keys.setdefault(row[2], set()).add(row[4])
+            has_key = set(UPSERT_KEYS) in unique_keys.values()
+
+            missing = []
+            if not has_column:
+                missing.append('rowhash')
+            if not has_key:
+                missing.append('uk_orderno_tmonth')
+            if apply:
+                for name in list(missing):
+                    print(f"执行: {UPSERT_SCHEMA[name]}")
+                    cursor.execute(UPSERT_SCHEMA[name])
+                    missing.remove(name)
+    return missing
+
+
+def get_workorder_fields(backend=None):
+    with (backend or get_backend()).connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DESC workorder;")
+            fields = [row[0] for row in cursor.fetchall() if row[0] != 'id']
     return fields
 
 
 def get_excel_header(file_path):
-    wb = openpyxl.load_workbook(file_path)
-    ws = wb.active
-    header = [str(cell).strip() for cell in next(ws.iter_rows(values_only=True))]
+    wb = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        ws = wb.active
+        header = [str(cell).strip() for cell in next(ws.iter_rows(values_only=True))]
+    finally:
+        wb.close()
     return header
 
 def get_excel_header_and_workorder_fields():
@@ -143,8 +1046,48 @@ def get_excel_header_and_workorder_fields():
     print("}") 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='把 source/workorder 下的工单明细导入 workorder 表')
+    parser.add_argument('tmonth', nargs='?', default='202504', help='写入 tmonth 字段的月份，如 202504')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='每批插入的行数，每批一个事务')
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE, help='数据库连接池大小')
+    parser.add_argument('--engine', choices=ENGINES, default='insert',
+                        help='插入方式：insert 逐条插入，multi 多行 INSERT，bulk 使用 LOAD DATA LOCAL INFILE（建议配合较大的 --chunk-size）')
+    parser.add_argument('--workers', type=int, help='并行解析文件的进程数，默认使用全部 CPU，为 1 时逐个文件导入')
+    parser.add_argument('--writers', type=int, default=WRITERS, help='并行导入时写入数据库的线程数')
+    parser.add_argument('--upsert', action='store_true', help='按 orderno + tmonth 更新已有工单，跳过未变化的工单')
+    parser.add_argument('--init-schema', action='store_true', help='upsert 前自动添加 rowhash 字段和唯一索引')
+    parser.add_argument('--backend', choices=BACKENDS, default='mysql', help='存储后端：mysql 或本地 sqlite 文件')
+    parser.add_argument('--sqlite-path', default=SQLITE_PATH, help='sqlite 后端使用的数据库文件')
+    parser.add_argument('--dry-run', action='store_true', help='只解析、校验并统计行数，不写入数据库')
+    parser.add_argument('--host', default=MYSQL_CONFIG['host'], help='数据库地址，可指向本地兼容 MySQL 的测试库')
+    parser.add_argument('--port', type=int, default=MYSQL_CONFIG['port'], help='数据库端口')
+    parser.add_argument('--user', default=MYSQL_CONFIG['user'], help='数据库用户')
+    parser.add_argument('--password', default=MYSQL_CONFIG['password'], help='数据库密码')
+    parser.add_argument('--database', default=MYSQL_CONFIG['database'], help='数据库名')
+    args = parser.parse_args()
+    config = dict(MYSQL_CONFIG, host=args.host, port=args.port, user=args.user,
+                  password=args.password, database=args.database)
+    if args.engine == 'bulk':
+        config['local_infile'] = True
+    # 每个写入线程占用一个连接
+    pool_size = max(1, args.pool_size, args.writers)
+    if args.dry_run:
+        backend = DryRunBackend(pool_size)
+    elif args.backend == 'sqlite':
+        backend = SQLiteBackend(args.sqlite_path, pool_size)
+    else:
+        backend = MySQLBackend(config, pool_size)
     excel_dir = os.path.join('source', 'workorder')
-    tmonth = '202504'
-    if len(sys.argv) > 1:
-        tmonth = sys.argv[1]
-    batch_import_from_dir(excel_dir, tmonth)
+    try:
+        missing = backend.check_schema(apply=args.init_schema) if args.upsert else []
+        if missing:
+            print("upsert 模式缺少以下表结构，请先执行（已有重复工单时需先清理）或加上 --init-schema：")
+            for statement in missing:
+                print(f"    {statement};")
+        else:
+            total = batch_import_from_dir(excel_dir, args.tmonth, max(1, args.chunk_size), backend, args.engine,
+                                          args.upsert, args.workers, max(1, args.writers))
+            if args.dry_run:
+                print(f"dry-run：{total} 条数据校验通过，未写入数据库。")
+    finally:
+        backend.close()
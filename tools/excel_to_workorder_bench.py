@@ -0,0 +1,205 @@
+"""
+工单导入的离线基准测试：生成合成的工单明细工作簿，用 dry-run 和 SQLite 后端导入，
+不需要 MySQL 服务器即可测量解析和写入的耗时。
+
+用法（在仓库根目录执行）：
+    python tools/excel_to_workorder_bench.py --files 4 --rows 20000 --backend all --json output/workorder_bench.json
+
+dry-run 只解析、校验和计数，耗时即为解析成本；sqlite 在此基础上写入本地文件，
+两者之差近似为写入成本。加上 --upsert 时每轮额外重复导入一次，测量跳过未变化工单的耗时。
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import openpyxl
+
+from excel_to_workorder import (COLUMN_FIELD_MAP, CHUNK_SIZE, WRITERS, DryRunBackend, SQLiteBackend,
+                                batch_import_from_dir)
+
+BUSINESS_TYPES = ['工具后台业务', '技术内部工作', '9377手游业务', '平台业务']
+FOLLOWS = ['业务需求', '投放需求', '技术工作', '缺陷修复']
+STATES = ['已结束', '进行中', '待测试']
+PEOPLE = ['[技术中心产品组]林燕琼', '[平台技术部][数据组]张纯奇', '[平台技术部][前端组]刘泽乾',
+          '[测试部][平台测试组]陈树望', '[其他]不需要QA介入', '[其他]不需要技术介入']
+PROJECTS = ['KFB', 'LHYYB', 'WORKORDER']
+
+
+def synthetic_row(orderno, month_start, rng):
+    """按真实工单明细的类型生成一行：日期为 yyyy/mm/dd 文本，分值为整数，预期时间混有小数"""
+    values = {
+        '业务分类': rng.choice(BUSINESS_TYPES),
+        # 真实数据中大部分工单号为整数，少数为带项目前缀的文本
+        '#': orderno if rng.random() < 0.9 else f'{rng.choice(PROJECTS)}-{orderno}',
+        '跟踪': rng.choice(FOLLOWS),
+        '状态': rng.choice(STATES),
+        '主题': f'工单{orderno}：{rng.choice(FOLLOWS)}优化与验收',
+        '作者': rng.choice(PEOPLE),
+        '风险星级': f'{rng.randint(1, 5)}星' if rng.random() < 0.9 else None,
+        '预期时间': rng.choice([rng.randint(1, 40), round(rng.random() * 10, 1)]),
+        '缺陷数量': rng.randint(0, 5),
+        '产品人员': rng.choice(PEOPLE) if rng.random() < 0.4 else None,
+        '技术人员': rng.choice(PEOPLE),
+        '测试人员': rng.choice(PEOPLE) if rng.random() < 0.9 else None,
+        '质控分值': rng.choice([85, 90, 95, 100]),
+        '速度分值': rng.choice([85, 90, 95, 100]),
+        '质量分值': rng.choice([85, 90, 95, 100]),
+        '态度分值': rng.choice([85, 90, 95, 100]),
+    }
+    for column in ('计划提测日期', '计划完成日期', '实际完成日期'):
+        values[column] = (month_start + timedelta(days=rng.randint(0, 27))).strftime('%Y/%m/%d')
+    return [values[column] for column in COLUMN_FIELD_MAP]
+
+
+def generate_workorder_workbooks(source_dir, files, rows, seed=0):
+    """在 source_dir 下生成 files 个工单明细工作簿，每个 rows 行，工单号在所有文件中唯一"""
+    rng = random.Random(seed)
+    month_start = date(2025, 4, 1)
+    orderno = 100000
+    for index in range(files):
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(list(COLUMN_FIELD_MAP))
+        for _ in range(rows):
+            orderno += 1
+            ws.append(synthetic_row(orderno, month_start, rng))
+        wb.save(source_dir / f'{index + 1}月工单明细.xlsx')
+
+
+def make_backend(name, workdir, pool_size):
+    if name == 'sqlite':
+        path = workdir / 'workorder.sqlite3'
+        for suffix in ('', '-wal', '-shm'):
+            Path(f'{path}{suffix}').unlink(missing_ok=True)
+        return SQLiteBackend(str(path), pool_size)
+    return DryRunBackend(pool_size)
+
+
+@contextlib.contextmanager
+def quiet_stdout():
+    """在文件描述符层面屏蔽标准输出，解析子进程的输出也一并屏蔽"""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def time_import(source_dir, backend, args, upsert):
+    """导入一次，返回耗时和导入的行数"""
+    start = time.perf_counter()
+    with quiet_stdout():
+        rows = batch_import_from_dir(str(source_dir), '202504', args.chunk_size, backend, args.engine, upsert,
+                                     args.workers, args.writers)
+    return time.perf_counter() - start, rows
+
+
+def run_benchmark(name, source_dir, workdir, args):
+    """对一个后端执行多轮导入，统计吞吐量"""
+    runs = []
+    for _ in range(args.rounds):
+        backend = make_backend(name, workdir, max(args.writers, 1))
+        try:
+            if args.upsert:
+                backend.check_schema(apply=True)
+            seconds, rows = time_import(source_dir, backend, args, args.upsert)
+            run = {'seconds': seconds, 'rows': rows}
+            if args.upsert:
+                # 数据未变化时再导入一次，全部工单都应被跳过
+                run['reimport_seconds'], run['reimport_rows'] = time_import(source_dir, backend, args, True)
+        finally:
+            backend.close()
+        runs.append(run)
+
+    best = min(runs, key=lambda run: run['seconds'])
+    result = {
+        'backend': name,
+        'rounds': args.rounds,
+        'rows': best['rows'],
+        'seconds_min': best['seconds'],
+        'seconds_mean': sum(run['seconds'] for run in runs) / len(runs),
+        'rows_per_sec': best['rows'] / best['seconds'],
+        'runs': runs,
+    }
+    if args.upsert:
+        result['reimport_seconds_min'] = min(run['reimport_seconds'] for run in runs)
+    if resource:
+        result['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def print_report(result):
+    """打印单个后端的测试结果"""
+    print(f"[{result['backend']}] {result['rows']} 行，{result['rounds']} 轮，最短 {result['seconds_min']:.2f} s，"
+          f"平均 {result['seconds_mean']:.2f} s，{result['rows_per_sec']:.0f} 行/秒")
+    if 'reimport_seconds_min' in result:
+        print(f"  数据未变化时重复导入最短 {result['reimport_seconds_min']:.2f} s")
+    if 'max_rss_mb' in result:
+        print(f"  进程最大 RSS {result['max_rss_mb']:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工单导入离线基准测试')
+    parser.add_argument('--files', type=int, default=4, help='生成的工单明细工作簿个数')
+    parser.add_argument('--rows', type=int, default=10000, help='每个工作簿的行数')
+    parser.add_argument('--backend', choices=['dry-run', 'sqlite', 'all'], default='all', help='要测试的存储后端')
+    parser.add_argument('--engine', default='insert', help='传给导入函数的插入引擎，SQLite 与 dry-run 后端忽略此参数')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='每批插入的行数')
+    parser.add_argument('--workers', type=int, help='并行解析文件的进程数，为 1 时逐个文件导入')
+    parser.add_argument('--writers', type=int, default=WRITERS, help='并行导入时的写入线程数')
+    parser.add_argument('--upsert', action='store_true', help='以 upsert 方式导入，并测量重复导入的耗时')
+    parser.add_argument('--rounds', type=int, default=3, help='每个后端的导入轮数')
+    parser.add_argument('--seed', type=int, default=0, help='生成数据的随机种子')
+    parser.add_argument('--workdir', help='生成数据和 SQLite 文件的目录，默认使用临时目录并在结束后删除')
+    parser.add_argument('--json', metavar='FILE', help='将结果写入 JSON 文件')
+    args = parser.parse_args()
+    args.chunk_size = max(1, args.chunk_size)
+    args.writers = max(1, args.writers)
+    args.rounds = max(1, args.rounds)
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='workorder_bench_'))
+    source_dir = workdir / 'workorder'
+    try:
+        source_dir.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        generate_workorder_workbooks(source_dir, max(1, args.files), max(1, args.rows), args.seed)
+        print(f"生成 {args.files} 个工作簿，每个 {args.rows} 行，用时 {time.perf_counter() - start:.2f} s")
+
+        backends = ['dry-run', 'sqlite'] if args.backend == 'all' else [args.backend]
+        results = []
+        for name in backends:
+            result = run_benchmark(name, source_dir, workdir, args)
+            print_report(result)
+            results.append(result)
+        if len(results) == 2:
+            write_cost = results[1]['seconds_min'] - results[0]['seconds_min']
+            print(f"写入 SQLite 的额外耗时约 {write_cost:.2f} s")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,66 @@
 import openpyxl
+import numpy as np
+import pandas as pd
 from pathlib import Path
 import os
 from copy import copy
-import win32com.client
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import iterparse, fromstring
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from openpyxl.worksheet.dimensions import ColumnDimension, RowDimension
+from openpyxl.styles import Font, Border, Side, PatternFill, Protection, Alignment
+import argparse
+import hashlib
+import pickle
+import re
 import time
-import xlwings as xw
+import warnings
+import zipfile
+
+try:
+    import xlrd
+except ImportError:
+    xlrd = None
+
+# 只有在没有 xlrd 时才需要通过 Excel 转换 xls 文件（仅限 Windows）
+try:
+    import xlwings as xw
+except ImportError:
+    xw = None
+
+# 单元格样式快照：可序列化，用于在进程之间传递
+CellStyle = namedtuple('CellStyle', ['font', 'border', 'fill', 'number_format', 'protection', 'alignment'])
+
+# 快照缓存版本：快照结构或提取逻辑变化时递增，使旧缓存失效
+MERGE_CACHE_VERSION = 2
+
+# xls 单元格对齐方式、边框线型到 openpyxl 取值的映射
+XLS_HORIZONTAL = {1: 'left', 2: 'center', 3: 'right', 4: 'fill', 5: 'justify', 6: 'centerContinuous', 7: 'distributed'}
+XLS_VERTICAL = {0: 'top', 1: 'center', 2: 'bottom', 3: 'justify', 4: 'distributed'}
+XLS_BORDER = {1: 'thin', 2: 'medium', 3: 'dashed', 4: 'dotted', 5: 'thick', 6: 'double', 7: 'hair',
+              8: 'mediumDashed', 9: 'dashDot', 10: 'mediumDashDot', 11: 'dashDotDot',
+              12: 'mediumDashDotDot', 13: 'slantDashDot'}
+XLS_UNDERLINE = {1: 'single', 2: 'double', 0x21: 'singleAccounting', 0x22: 'doubleAccounting'}
+
+# 工作表 XML 的命名空间
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+CONTENT_TYPES_NS = '{http://schemas.openxmlformats.org/package/2006/content-types}'
+
+# xls（OLE2 复合文档）的文件头
+OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# 分组统计的默认分组：总表中没有组别列，按来源文件名中的组名（如“安卓组”）分组
+SOURCE_GROUP_COLUMN = '来源组'
+GROUP_NAME_PATTERN = re.compile(r'[^\s\-—_()（）\d]+组')
+
+def source_group(file_name):
+    """从文件名中取出组名，如“平台技术部-中台组-202504.xlsx”取“中台组”，取不到时使用文件名"""
+    stem = Path(file_name).stem
+    names = GROUP_NAME_PATTERN.findall(stem)
+    return names[-1] if names else stem
 
 def convert_xls_to_xlsx(xls_path):
     """使用 xlwings 将 xls 转换为 xlsx，保留所有格式"""
@@ -55,57 +111,648 @@ def convert_xls_to_xlsx(xls_path):
         except:
             pass
         
-def merge_summary_sheets(summary_sheets):
-    """合并汇总表，正确处理表头"""
+def cell_style(cell):
+    """取出单元格样式的快照"""
+    return CellStyle(
+        copy(cell.font), copy(cell.border), copy(cell.fill),
+        cell.number_format, copy(cell.protection), copy(cell.alignment)
+    )
+
+def sheet_layout(source_sheet):
+    """取出列宽、行高和合并单元格，只遍历已定义的条目，不按使用区域逐行逐列查找"""
+    column_widths = []
+    for col_letter, dimension in source_sheet.column_dimensions.items():
+        if dimension.width is not None:
+            min_col = dimension.min or column_index_from_string(col_letter)
+            column_widths.append((min_col, dimension.max or min_col, dimension.width))
+    row_heights = {
+        row: dimension.height
+        for row, dimension in source_sheet.row_dimensions.items()
+        if dimension.height is not None
+    }
+    merged_ranges = [str(merged_range) for merged_range in source_sheet.merged_cells.ranges]
+    return column_widths, row_heights, merged_ranges
+
+def extract_sheet_snapshot(source_sheet):
+    """提取 sheet 的数据、列宽、行高、合并单元格和样式，结果可以序列化"""
+    styles = []
+    style_ids = {}
+    cells = []
+    for row in source_sheet.rows:
+        for cell in row:
+            style_id = None
+            if cell.has_style:
+                # 同一工作簿内相同样式的单元格共用一份样式快照
+                key = tuple(cell._style)
+                style_id = style_ids.get(key)
+                if style_id is None:
+                    style_id = style_ids[key] = len(styles)
+                    styles.append(cell_style(cell))
+            if cell.value is not None or style_id is not None:
+                cells.append((cell.row, cell.column, cell.value, style_id))
+
+    column_widths, row_heights, merged_ranges = sheet_layout(source_sheet)
+    return {
+        'title': source_sheet.title,
+        'max_row': source_sheet.max_row,
+        'max_column': source_sheet.max_column,
+        'cells': cells,
+        'styles': styles,
+        'column_widths': column_widths,
+        'row_heights': row_heights,
+        'merged_ranges': merged_ranges
+    }
+
+def xls_color(book, color_index):
+    """把 xls 调色板编号转换为 ARGB 颜色，系统默认色返回 None"""
+    rgb = book.colour_map.get(color_index)
+    if rgb is None:
+        return None
+    return 'FF%02X%02X%02X' % rgb
+
+def xls_cell_style(book, xf):
+    """把 xls 的 XF 格式记录转换为 CellStyle"""
+    xls_font = book.font_list[xf.font_index]
+    font = Font(
+        name=xls_font.name, size=xls_font.height / 20, bold=bool(xls_font.bold),
+        italic=bool(xls_font.italic), strike=bool(xls_font.struck_out),
+        underline=XLS_UNDERLINE.get(xls_font.underline_type), color=xls_color(book, xls_font.colour_index)
+    )
+
+    xls_border = xf.border
+    def side(line_style, color_index):
+        if not line_style:
+            return Side()
+        return Side(style=XLS_BORDER.get(line_style, 'thin'), color=xls_color(book, color_index))
+    border = Border(
+        left=side(xls_border.left_line_style, xls_border.left_colour_index),
+        right=side(xls_border.right_line_style, xls_border.right_colour_index),
+        top=side(xls_border.top_line_style, xls_border.top_colour_index),
+        bottom=side(xls_border.bottom_line_style, xls_border.bottom_colour_index)
+    )
+
+    # 只处理实心填充，其他图案填充在绩效表中没有用到
+    fill = PatternFill()
+    if xf.background.fill_pattern == 1:
+        color = xls_color(book, xf.background.pattern_colour_index)
+        if color:
+            fill = PatternFill('solid', fgColor=color)
+
+    xls_format = book.format_map.get(xf.format_key)
+    number_format = xls_format.format_str if xls_format and xf.format_key else 'General'
+
+    alignment = Alignment(
+        horizontal=XLS_HORIZONTAL.get(xf.alignment.hor_align),
+        vertical=XLS_VERTICAL.get(xf.alignment.vert_align),
+        wrap_text=bool(xf.alignment.text_wrapped) or None,
+        shrink_to_fit=bool(xf.alignment.shrink_to_fit) or None,
+        indent=xf.alignment.indent_level,
+        text_rotation=xf.alignment.rotation
+    )
+    protection = Protection(locked=bool(xf.protection.cell_locked), hidden=bool(xf.protection.formula_hidden))
+    return CellStyle(font, border, fill, number_format, protection, alignment)
+
+def xls_cell_value(book, cell):
+    """按单元格类型还原 xls 单元格的值，与 openpyxl 读取 xlsx 的结果保持一致"""
+    if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+        return None
+    if cell.ctype == xlrd.XL_CELL_NUMBER:
+        return int(cell.value) if cell.value.is_integer() else cell.value
+    if cell.ctype == xlrd.XL_CELL_DATE:
+        try:
+            return xlrd.xldate.xldate_as_datetime(cell.value, book.datemode)
+        except xlrd.xldate.XLDateError:
+            return cell.value
+    if cell.ctype == xlrd.XL_CELL_BOOLEAN:
+        return bool(cell.value)
+    if cell.ctype == xlrd.XL_CELL_ERROR:
+        return xlrd.error_text_from_code.get(cell.value)
+    return cell.value
+
+def extract_xls_sheet_snapshot(book, source_sheet):
+    """提取 xls sheet 的快照，结构与 extract_sheet_snapshot 相同"""
+    styles = []
+    style_ids = {}
+    cells = []
+    for row in range(source_sheet.nrows):
+        for column, cell in enumerate(source_sheet.row(row)):
+            # 默认格式的单元格与 xlsx 中没有样式的单元格一样处理
+            style_id = None
+            if cell.xf_index:
+                style_id = style_ids.get(cell.xf_index)
+                if style_id is None:
+                    style_id = style_ids[cell.xf_index] = len(styles)
+                    styles.append(xls_cell_style(book, book.xf_list[cell.xf_index]))
+            value = xls_cell_value(book, cell)
+            if value is not None or style_id is not None:
+                cells.append((row + 1, column + 1, value, style_id))
+
+    # xls 的列宽以 1/256 字符为单位，行高以 1/20 磅为单位
+    column_widths = [
+        (col + 1, col + 1, info.width / 256)
+        for col, info in source_sheet.colinfo_map.items()
+    ]
+    row_heights = {
+        row + 1: info.height / 20
+        for row, info in source_sheet.rowinfo_map.items()
+        if info.height_mismatch
+    }
+    merged_ranges = [
+        f"{get_column_letter(col_low + 1)}{row_low + 1}:{get_column_letter(col_high)}{row_high}"
+        for row_low, row_high, col_low, col_high in source_sheet.merged_cells
+    ]
+
+    return {
+        'title': source_sheet.name,
+        'max_row': source_sheet.nrows,
+        'max_column': source_sheet.ncols,
+        'cells': cells,
+        'styles': styles,
+        'column_widths': column_widths,
+        'row_heights': row_heights,
+        'merged_ranges': merged_ranges
+    }
+
+def load_xls_snapshot(excel_file):
+    """用 xlrd 直接读取 xls 文件，不需要 Excel，也不生成临时文件"""
+    try:
+        book = xlrd.open_workbook(str(excel_file), formatting_info=True)
+    except Exception as e:
+        print(f"无法打开文件 {excel_file.name}: {str(e)}")
+        return None
+    try:
+        return {
+            'file': excel_file.name,
+            'sheets': [extract_xls_sheet_snapshot(book, sheet) for sheet in book.sheets()]
+        }
+    finally:
+        book.release_resources()
+
+def load_xls_header(excel_file, title='总表'):
+    """只读取 xls 文件中一个 sheet 的第一行，返回 (值, 样式) 列表，没有该 sheet 或读取失败时返回 None"""
+    try:
+        # on_demand 模式下只解析用到的 sheet
+        book = xlrd.open_workbook(str(excel_file), formatting_info=True, on_demand=True)
+    except Exception:
+        return None
+    try:
+        if title not in book.sheet_names():
+            return None
+        sheet = book.sheet_by_name(title)
+        if not sheet.nrows:
+            return None
+        return [
+            (xls_cell_value(book, cell), xls_cell_style(book, book.xf_list[cell.xf_index]) if cell.xf_index else None)
+            for cell in sheet.row(0)
+        ]
+    finally:
+        book.release_resources()
+
+def load_workbook_snapshot(excel_file):
+    """读取一个工作簿并提取所有 sheet 的快照，在子进程中执行"""
+    if excel_file.suffix.lower() == '.xls':
+        return load_xls_snapshot(excel_file)
+    try:
+        wb = openpyxl.load_workbook(excel_file, data_only=True)
+    except Exception as e:
+        print(f"无法打开文件 {excel_file.name}: {str(e)}")
+        return None
+    try:
+        return {
+            'file': excel_file.name,
+            'sheets': [extract_sheet_snapshot(ws) for ws in wb.worksheets]
+        }
+    finally:
+        wb.close()
+
+def load_workbook_snapshots(excel_files, workers=None):
+    """使用进程池并行读取工作簿，返回顺序与 excel_files 一致"""
+    if workers == 1 or len(excel_files) <= 1:
+        return [load_workbook_snapshot(excel_file) for excel_file in excel_files]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(load_workbook_snapshot, excel_files))
+
+def file_digest(file_path):
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class SnapshotCache:
+    """按文件内容哈希缓存工作簿快照，内容未变化的文件无需重新解析"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.used = set()
+
+    def path(self, digest):
+        """缓存文件名由工具版本和文件内容哈希（file_digest 的结果）组成"""
+        return self.cache_dir / f"v{MERGE_CACHE_VERSION}-{digest}.pkl"
+
+    def get(self, digest):
+        """读取缓存的快照，不存在或已损坏时返回 None"""
+        cache_file = self.path(digest)
+        self.used.add(cache_file.name)
+        if not cache_file.exists():
+            return None
+        try:
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"读取缓存失败 {cache_file.name}: {str(e)}")
+            return None
+
+    def put(self, digest, snapshot):
+        """保存快照"""
+        cache_file = self.path(digest)
+        self.used.add(cache_file.name)
+        tmp_file = cache_file.with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_file.replace(cache_file)
+
+    def prune(self):
+        """删除本次没有用到的缓存（源文件已修改或删除、工具版本已变化）"""
+        for cache_file in self.cache_dir.glob('*.pkl'):
+            if cache_file.name not in self.used:
+                cache_file.unlink()
+
+def copy_dimensions(target_sheet, column_widths, row_heights):
+    """批量设置列宽和行高，column_widths 为 (起始列, 结束列, 宽度) 列表"""
+    target_sheet.column_dimensions.update({
+        get_column_letter(min_col): ColumnDimension(
+            target_sheet, index=get_column_letter(min_col), width=width, min=min_col, max=max_col)
+        for min_col, max_col, width in column_widths
+    })
+    target_sheet.row_dimensions.update({
+        row: RowDimension(target_sheet, index=row, ht=height)
+        for row, height in row_heights.items()
+    })
+
+def copy_merged_ranges(target_sheet, merged_ranges):
+    """批量登记合并单元格：不为区域内的每个单元格创建 MergedCell，也不逐个检查重叠"""
+    if merged_ranges:
+        target_sheet.merged_cells = MultiCellRange(
+            list(target_sheet.merged_cells.ranges)
+            + [CellRange(merged_range) for merged_range in merged_ranges]
+        )
+
+def write_sheet_snapshot(workbook, snapshot, style_cache=None):
+    """把 sheet 快照写入目标工作簿"""
+    style_cache = style_cache or StyleCache()
+    target_sheet = workbook.create_sheet(title=snapshot['title'])
+
+    # 复制列宽和行高
+    copy_dimensions(target_sheet, snapshot['column_widths'], snapshot['row_heights'])
+
+    # 复制单元格内容和格式
+    styles = snapshot['styles']
+    for row, column, value, style_id in snapshot['cells']:
+        new_cell = target_sheet.cell(row=row, column=column, value=value)
+        if style_id is not None:
+            try:
+                style_cache.apply(styles[style_id], new_cell)
+            except Exception as e:
+                print(f"复制单元格格式时出错: {str(e)}")
+
+    # 复制合并单元格
+    copy_merged_ranges(target_sheet, snapshot['merged_ranges'])
+    return target_sheet
+
+def snapshot_rows(snapshot):
+    """把 sheet 快照还原为按行排列的 (值, 样式) 列表"""
+    grid = {(row, column): (value, style_id) for row, column, value, style_id in snapshot['cells']}
+    styles = snapshot['styles']
+    for row in range(1, snapshot['max_row'] + 1):
+        cells = []
+        for column in range(1, snapshot['max_column'] + 1):
+            value, style_id = grid.get((row, column), (None, None))
+            cells.append((value, styles[style_id] if style_id is not None else None))
+        yield cells
+
+def read_sheet_layout(workbook, source_sheet):
+    """流式扫描只读 sheet 的 XML，取出列宽、行高和合并单元格，不构建单元格对象"""
+    column_widths = []
+    row_heights = {}
+    merged_ranges = []
+    # 依赖 openpyxl 只读模式的内部属性（3.1 中可用），升级后不存在时只复制数据，不复制格式布局
+    archive = getattr(workbook, '_archive', None)
+    sheet_path = getattr(source_sheet, '_worksheet_path', None)
+    if archive is None or sheet_path is None:
+        warnings.warn(f"openpyxl {openpyxl.__version__} 的只读工作簿不支持读取列宽、行高和合并单元格，"
+                      "流式合并将跳过这些格式")
+        return column_widths, row_heights, merged_ranges
+    sheet_data = None
+    row_index = 0
+    with archive.open(sheet_path) as source:
+        for event, element in iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                if element.tag == SHEET_NS + 'sheetData':
+                    sheet_data = element
+                continue
+            if element.tag == SHEET_NS + 'col':
+                if element.get('width') is not None:
+                    column_widths.append((int(element.get('min')), int(element.get('max')), float(element.get('width'))))
+            elif element.tag == SHEET_NS + 'row':
+                row_index = int(element.get('r', row_index + 1))
+                if element.get('ht') is not None:
+                    row_heights[row_index] = float(element.get('ht'))
+                # 丢弃已扫描的行，保持内存占用不变
+                sheet_data.clear()
+            elif element.tag == SHEET_NS + 'mergeCell':
+                merged_ranges.append(element.get('ref'))
+    return column_widths, row_heights, merged_ranges
+
+def stream_row(target_sheet, row, style_cache, file_key):
+    """把只读 sheet 的一行转换为带格式的只写单元格，file_key 用于区分不同源文件的样式编号"""
+    cells = []
+    for source_cell in row:
+        cell = WriteOnlyCell(target_sheet, value=source_cell.value)
+        # 只读模式下的空单元格（EmptyCell）没有样式属性
+        if getattr(source_cell, 'has_style', False):
+            style_cache.apply_source_cell((file_key, source_cell._style_id), source_cell, cell)
+        cells.append(cell)
+    return cells
+
+def stream_sheet(workbook, source_sheet, merged_wb, style_cache, file_key):
+    """逐行把只读 sheet 复制到只写工作簿中"""
+    target_sheet = merged_wb.create_sheet(title=source_sheet.title)
+    column_widths, row_heights, merged_ranges = read_sheet_layout(workbook, source_sheet)
+
+    # 只写模式下列宽、行高需要在写入行之前设置
+    copy_dimensions(target_sheet, column_widths, row_heights)
+
+    for row in source_sheet.iter_rows():
+        target_sheet.append(stream_row(target_sheet, row, style_cache, file_key))
+
+    copy_merged_ranges(target_sheet, merged_ranges)
+
+def snapshot_cells(target_sheet, row, style_cache):
+    """把快照中的一行 (值, 样式) 转换为带格式的只写单元格"""
+    cells = []
+    for value, style in row:
+        cell = WriteOnlyCell(target_sheet, value=value)
+        style_cache.apply(style, cell)
+        cells.append(cell)
+    return cells
+
+def stream_snapshot_sheet(merged_wb, snapshot, style_cache):
+    """把 sheet 快照写入只写工作簿"""
+    target_sheet = merged_wb.create_sheet(title=snapshot['title'])
+    copy_dimensions(target_sheet, snapshot['column_widths'], snapshot['row_heights'])
+    for row in snapshot_rows(snapshot):
+        target_sheet.append(snapshot_cells(target_sheet, row, style_cache))
+    copy_merged_ranges(target_sheet, snapshot['merged_ranges'])
+
+def summary_columns(header):
+    """把表头转换为列的键：按表头名称对齐，同名列按出现次数区分，空表头按列位置区分"""
+    keys = []
+    seen = {}
+    for position, name in enumerate(header):
+        if isinstance(name, str):
+            name = name.strip()
+        if name is None or name == '':
+            keys.append((None, position))
+        else:
+            seen[name] = seen.get(name, 0) + 1
+            keys.append((name, seen[name]))
+    return keys
+
+def summary_sheet_header(excel_file, summary_sheet, style_cache, file_key):
+    """读取一个文件总表的表头行，转换为合并后总表的只写单元格，没有总表时返回 None"""
+    if excel_file.suffix.lower() == '.xls':
+        header = load_xls_header(excel_file)
+        return snapshot_cells(summary_sheet, header, style_cache) if header else None
+    try:
+        wb = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    except Exception:
+        # 打开失败的文件在逐行复制时再报告
+        return None
+    try:
+        if '总表' not in wb.sheetnames:
+            return None
+        header = next(wb['总表'].iter_rows(max_row=1), None)
+        return stream_row(summary_sheet, header, style_cache, file_key) if header else None
+    finally:
+        wb.close()
+
+def stream_summary_rows(summary_sheet, rows, convert, positions, width):
+    """把一个总表的数据行按表头对齐后追加到合并后的总表"""
+    # 跳过表头行
+    next(rows, None)
+    for row in rows:
+        cells = [None] * width
+        for position, cell in zip(positions, convert(summary_sheet, row)):
+            cells[position] = cell
+        summary_sheet.append(cells)
+
+def stream_merge_files(excel_files, output_file):
+    """流式合并：只读模式读取源文件，只写模式写出结果，内存占用不随数据量增长"""
+    merged_wb = openpyxl.Workbook(write_only=True)
+    style_cache = StyleCache()
+
+    # 先扫描所有总表的表头，确定合并后的列；只写模式下表头必须最先写入
+    summary_sheet = merged_wb.create_sheet(title='总表')
+    schema = {}
+    header_cells = []
+    positions = {}
+    for file_key, excel_file in enumerate(excel_files):
+        header = summary_sheet_header(excel_file, summary_sheet, style_cache, file_key)
+        if not header:
+            continue
+        positions[file_key] = []
+        for key, cell in zip(summary_columns([cell.value for cell in header]), header):
+            if key not in schema:
+                schema[key] = len(header_cells)
+                header_cells.append(cell)
+            positions[file_key].append(schema[key])
+    if header_cells:
+        summary_sheet.append(header_cells)
+    else:
+        merged_wb.remove(summary_sheet)
+
+    for file_key, excel_file in enumerate(excel_files):
+        if excel_file.suffix.lower() == '.xls':
+            # xlrd 不支持按行读取，xls 文件整体读成快照后再逐行写出，写完即释放
+            snapshot = load_xls_snapshot(excel_file)
+            if snapshot is None:
+                continue
+            for sheet in snapshot['sheets']:
+                if sheet['title'] == '总表':
+                    print(f"正在处理 {excel_file.name} 的总表sheet")
+                    stream_summary_rows(
+                        summary_sheet, iter(snapshot_rows(sheet)),
+                        lambda target_sheet, row: snapshot_cells(target_sheet, row, style_cache),
+                        positions.get(file_key, []), len(header_cells))
+                else:
+                    print(f"正在复制 {excel_file.name} 的 {sheet['title']} sheet")
+                    stream_snapshot_sheet(merged_wb, sheet, style_cache)
+            snapshot = sheet = None
+            continue
+
+        try:
+            wb = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+        except Exception as e:
+            print(f"无法打开文件 {excel_file.name}: {str(e)}")
+            continue
+        try:
+            for source_sheet in wb.worksheets:
+                if source_sheet.title == '总表':
+                    print(f"正在处理 {excel_file.name} 的总表sheet")
+                    stream_summary_rows(
+                        summary_sheet, source_sheet.iter_rows(),
+                        lambda target_sheet, row: stream_row(target_sheet, row, style_cache, file_key),
+                        positions.get(file_key, []), len(header_cells))
+                else:
+                    print(f"正在复制 {excel_file.name} 的 {source_sheet.title} sheet")
+                    stream_sheet(wb, source_sheet, merged_wb, style_cache, file_key)
+        finally:
+            wb.close()
+    merged_wb.save(output_file)
+
+def snapshot_header(snapshot):
+    """取出 sheet 快照第一行的 (值, 样式) 列表"""
+    header = [(None, None)] * snapshot['max_column']
+    styles = snapshot['styles']
+    # 快照中的单元格按行排列，读到第二行即可停止
+    for row, column, value, style_id in snapshot['cells']:
+        if row > 1:
+            break
+        header[column - 1] = (value, styles[style_id] if style_id is not None else None)
+    return header
+
+def summary_frame(sheet, positions, start_row=2):
+    """把总表快照中第 start_row 行之后的单元格按列展开为 DataFrame，列号为合并后的列位置"""
+    cells = pd.DataFrame(sheet['cells'], columns=['row', 'column', 'value', 'style'], dtype=object)
+    rows = cells['row'].to_numpy(dtype=int)
+    columns = cells['column'].to_numpy(dtype=int)
+    keep = (rows >= start_row) & (columns <= len(positions))
+    cells = cells[keep]
+    cells['position'] = np.asarray(positions, dtype=int)[columns[keep] - 1]
+
+    # 样式编号换成样式对象，-1 对应没有样式
+    style_table = np.empty(len(sheet['styles']) + 1, dtype=object)
+    for style_id, style in enumerate(sheet['styles']):
+        style_table[style_id] = style
+    style_ids = pd.to_numeric(cells['style']).fillna(-1).to_numpy(dtype=int)
+    cells['style'] = style_table[style_ids]
+
+    rows = pd.RangeIndex(start_row, sheet['max_row'] + 1)
+    values = cells.pivot(index='row', columns='position', values='value').reindex(index=rows)
+    formats = cells.pivot(index='row', columns='position', values='style').reindex(index=rows)
+    return values, formats
+
+def merge_summary_sheets(summary_sheets, sources=None):
+    """按表头名称对齐合并汇总表，数据和样式按列存放在 DataFrame 中
+
+    sources 为每个总表的来源组名，合并后每行的来源组保存在结果的 sources 中。
+    """
     if not summary_sheets:
         return None
         
     try:
-        # 获取第一个sheet作为基准
-        first_sheet = summary_sheets[0]
-        header_row = None
-        merged_rows = []
-        
-        # 从第一个sheet获取表头
-        for row in first_sheet.rows:
-            header_row = [cell.value for cell in row]
-            break  # 只获取第一行作为表头
-            
+        schema = {}
+        header_row = []
+        header_format = []
+        value_frames = []
+        style_frames = []
+        row_sources = []
+
+        # 处理每个汇总sheet
+        for sheet, source in zip(summary_sheets, sources or [None] * len(summary_sheets)):
+            header = snapshot_header(sheet)
+            if not header:
+                continue
+
+            # 第一个总表的列顺序作为基准，其他总表新出现的列依次追加在后面
+            positions = []
+            for key, (value, style) in zip(summary_columns([value for value, _ in header]), header):
+                if key not in schema:
+                    schema[key] = len(header_row)
+                    header_row.append(value)
+                    header_format.append(style)  # 保存表头行的格式
+                positions.append(schema[key])
+
+            # 跳过每个sheet的表头行（第一行）
+            values, formats = summary_frame(sheet, positions)
+            value_frames.append(values)
+            style_frames.append(formats)
+            row_sources.extend([source] * len(values))
+
         if not header_row:
             return None
-            
-        # 处理每个汇总sheet
-        for sheet in summary_sheets:
-            is_first_row = True
-            for row in sheet.rows:
-                # 跳过每个sheet的表头行（第一行）
-                if is_first_row:
-                    is_first_row = False
-                    continue
-                    
-                # 收集行数据
-                row_data = []
-                for cell in row:
-                    row_data.append({
-                        'value': cell.value,
-                        'cell': cell  # 保存原始单元格以便复制格式
-                    })
-                merged_rows.append(row_data)
-        
+
+        columns = pd.RangeIndex(len(header_row))
+        values = pd.concat(value_frames, ignore_index=True).reindex(columns=columns).astype(object)
+        formats = pd.concat(style_frames, ignore_index=True).reindex(columns=columns).astype(object)
         return {
             'header': header_row,
-            'rows': merged_rows,
-            'header_format': list(first_sheet.rows)[0]  # 保存表头行的格式
+            'values': values.where(values.notna(), None),
+            'styles': formats.where(formats.notna(), None),
+            'header_format': header_format,
+            'sources': pd.Series(row_sources, index=values.index, dtype=object)
         }
         
     except Exception as e:
         print(f"合并汇总表时出错: {str(e)}")
         return None
 
-def write_merged_summary(workbook, merged_data):
+def group_totals(merged_data, group_by, sum_columns=None):
+    """按分组列统计人数和数值列合计，未指定 sum_columns 时合计所有数值列
+
+    group_by 为 SOURCE_GROUP_COLUMN 且总表中没有同名列时，按每行来源文件的组名分组。
+    """
+    header = merged_data['header']
+    values = merged_data['values']
+    if group_by in header:
+        groups = values[header.index(group_by)]
+    elif group_by == SOURCE_GROUP_COLUMN:
+        # 空行不计入人数
+        groups = merged_data['sources'].where(values.notna().any(axis=1))
+    else:
+        print(f"总表中没有分组列: {group_by}")
+        return None
+
+    if sum_columns is None:
+        sum_columns = []
+        for position, name in enumerate(header):
+            column = values[position]
+            if name is None or name == group_by or column.notna().sum() == 0:
+                continue
+            # 所有非空值都是数字的列才参与合计
+            if pd.to_numeric(column, errors='coerce').notna().sum() == column.notna().sum():
+                sum_columns.append(name)
+    missing = [name for name in sum_columns if name not in header]
+    if missing:
+        print(f"总表中没有合计列: {', '.join(map(str, missing))}")
+        sum_columns = [name for name in sum_columns if name in header]
+
+    numeric = pd.DataFrame({
+        name: pd.to_numeric(values[header.index(name)], errors='coerce') for name in sum_columns
+    }, index=values.index)
+    grouped = numeric.groupby(groups, sort=False)
+    totals = grouped.sum()
+    totals.insert(0, '人数', grouped.size())
+    totals.index.name = group_by
+    return totals
+
+def write_group_totals(workbook, totals, index=1):
+    """把分组统计写入“分组汇总”sheet"""
+    sheet = workbook.create_sheet(title='分组汇总', index=index)
+    sheet.append([totals.index.name] + list(totals.columns))
+    for cell in sheet[1]:
+        cell.font = Font(bold=True)
+    for group, *row in totals.itertuples():
+        sheet.append([group] + [value.item() if hasattr(value, 'item') else value for value in row])
+
+def write_merged_summary(workbook, merged_data, style_cache=None):
     """将合并后的汇总数据写入新的工作簿"""
     if not merged_data or 'header' not in merged_data:
         return
+    style_cache = style_cache or StyleCache()
         
     try:
         # 创建汇总sheet
@@ -115,51 +762,96 @@ def write_merged_summary(workbook, merged_data):
         for col_idx, header_value in enumerate(merged_data['header'], 1):
             cell = summary_sheet.cell(row=1, column=col_idx, value=header_value)
             # 复制表头格式
-            source_cell = merged_data['header_format'][col_idx-1]
-            copy_cell_format(source_cell, cell)
+            source_style = merged_data['header_format'][col_idx-1]
+            style_cache.apply(source_style, cell)
         
-        # 写入数据行
-        for row_idx, row_data in enumerate(merged_data['rows'], 2):  # 从第2行开始
-            for col_idx, cell_data in enumerate(row_data, 1):
-                cell = summary_sheet.cell(
-                    row=row_idx,
-                    column=col_idx,
-                    value=cell_data['value']
-                )
+        # 写入数据行，从第2行开始
+        rows = zip(merged_data['values'].itertuples(index=False), merged_data['styles'].itertuples(index=False))
+        for row_idx, (row_values, row_styles) in enumerate(rows, 2):
+            for col_idx, (value, style) in enumerate(zip(row_values, row_styles), 1):
+                if value is None and style is None:
+                    continue
+                cell = summary_sheet.cell(row=row_idx, column=col_idx, value=value)
                 # 复制单元格格式
-                copy_cell_format(cell_data['cell'], cell)
+                style_cache.apply(style, cell)
                 
     except Exception as e:
         print(f"写入合并后的汇总表时出错: {str(e)}")
         
-def copy_cell_format(source_cell, target_cell):
-    """复制单元格格式"""
-    if source_cell.has_style:
-        target_cell.font = copy(source_cell.font)
-        target_cell.border = copy(source_cell.border)
-        target_cell.fill = copy(source_cell.fill)
-        target_cell.number_format = copy(source_cell.number_format)
-        target_cell.protection = copy(source_cell.protection)
-        target_cell.alignment = copy(source_cell.alignment)
-
-def is_valid_excel(file_path):
-    """验证Excel文件是否有效"""
+def copy_cell_format(source_style, target_cell):
+    """复制单元格格式，source_style 为 CellStyle 快照，None 表示没有样式"""
+    if source_style is not None:
+        target_cell.font = copy(source_style.font)
+        target_cell.border = copy(source_style.border)
+        target_cell.fill = copy(source_style.fill)
+        target_cell.number_format = copy(source_style.number_format)
+        target_cell.protection = copy(source_style.protection)
+        target_cell.alignment = copy(source_style.alignment)
+
+class StyleCache:
+    """样式驻留缓存：相同的源样式在目标工作簿中只创建一次，之后的单元格直接共用"""
+
+    def __init__(self):
+        self.by_signature = {}
+        self.by_identity = {}
+        self.by_source = {}
+
+    def style_array(self, source_style, target_cell):
+        """返回源样式在目标工作簿中的样式索引，首次出现时按原方式复制一次"""
+        entry = self.by_identity.get(id(source_style))
+        if entry is not None and entry[0] is source_style:
+            return entry[1]
+        style_array = self.by_signature.get(source_style)
+        if style_array is None:
+            copy_cell_format(source_style, target_cell)
+            style_array = self.by_signature[source_style] = copy(target_cell._style)
+        # 同一个样式对象再次出现时不必重新计算签名
+        self.by_identity[id(source_style)] = (source_style, style_array)
+        return style_array
+
+    def apply(self, source_style, target_cell):
+        """把 CellStyle 快照应用到目标单元格"""
+        if source_style is not None:
+            target_cell._style = copy(self.style_array(source_style, target_cell))
+
+    def apply_source_cell(self, source_key, source_cell, target_cell):
+        """按源工作簿内的样式编号复用样式，用于流式复制"""
+        style_array = self.by_source.get(source_key)
+        if style_array is None:
+            style_array = self.by_source[source_key] = self.style_array(cell_style(source_cell), target_cell)
+        target_cell._style = copy(style_array)
+
+def probe_excel(file_path):
+    """只检查文件结构（文件头、zip 容器和 sheet 列表），不解析单元格；有效时返回 None，否则返回原因"""
     try:
         if file_path.suffix.lower() == '.xls':
-            # 尝试用 Excel COM 对象打开文件
-            excel = win32com.client.Dispatch("Excel.Application")
-            excel.Visible = False
-            wb = excel.Workbooks.Open(str(file_path.absolute()))
-            wb.Close()
-            excel.Quit()
-        else:
-            openpyxl.load_workbook(file_path, read_only=True)
-        return True
+            with open(file_path, 'rb') as f:
+                if f.read(len(OLE2_SIGNATURE)) != OLE2_SIGNATURE:
+                    return "缺少 OLE2 文件头，不是有效的 xls 文件"
+            return None
+
+        if not zipfile.is_zipfile(file_path):
+            return "不是 zip 格式，不是有效的 xlsx 文件"
+        with zipfile.ZipFile(file_path) as archive:
+            names = set(archive.namelist())
+            if '[Content_Types].xml' not in names:
+                return "缺少 [Content_Types].xml"
+            # 工作簿的位置以 [Content_Types].xml 中登记的为准
+            content_types = fromstring(archive.read('[Content_Types].xml'))
+            workbook_part = next((
+                override.get('PartName') for override in content_types.iter(CONTENT_TYPES_NS + 'Override')
+                if override.get('ContentType', '').endswith('.main+xml')
+            ), None)
+            if workbook_part is None or workbook_part.lstrip('/') not in names:
+                return "找不到工作簿 workbook.xml"
+            sheets = fromstring(archive.read(workbook_part.lstrip('/'))).find(SHEET_NS + 'sheets')
+            if sheets is None or len(sheets) == 0:
+                return "工作簿中没有 sheet"
+        return None
     except Exception as e:
-        print(f"无效的Excel文件 {file_path}: {str(e)}")
-        return False
+        return str(e)
 
-def merge_excel_files():
+def merge_excel_files(workers=None, streaming=False, use_cache=True, group_by=None, sum_columns=None, timings=None):
     # 定义源目录路径，用于存放待合并的Excel文件
     source_dir = Path('source/performance')
     
@@ -175,9 +867,18 @@ def merge_excel_files():
     # 创建新的工作簿
     merged_wb = openpyxl.Workbook()
     merged_wb.remove(merged_wb.active)
+    style_cache = StyleCache()
     
     # 用于存储所有"汇总"sheet的数据和格式
     summary_cells = []
+
+    # 各阶段耗时（秒），传入 timings 字典时由基准测试读取
+    timings = {} if timings is None else timings
+    phase_start = [time.perf_counter()]
+    def end_phase(phase):
+        now = time.perf_counter()
+        timings[phase] = now - phase_start[0]
+        phase_start[0] = now
     
     try:
         # 获取所有Excel文件
@@ -187,92 +888,111 @@ def merge_excel_files():
         
         # 用于存储所有汇总sheet
         summary_sheets = []
+        summary_sources = []
 
-        # 遍历source目录下的所有excel文件
+        # 快照缓存只用于非流式模式
+        snapshot_cache = SnapshotCache(output_dir / 'merge_cache') if use_cache and not streaming else None
+
+        # 验证文件并把 xls 转换为 xlsx，得到待读取的文件列表（源文件, 读取文件, 缓存的快照）
+        sources = []
+        # 每个文件只计算一次内容哈希，读取和写入缓存共用
+        digests = {}
         for excel_file in excel_files:
             print(f"正在处理文件: {excel_file.name}")
+
+            # 内容未变化的文件直接使用缓存的快照，跳过验证、转换和解析
+            if snapshot_cache:
+                digests[excel_file] = file_digest(excel_file)
+                snapshot = snapshot_cache.get(digests[excel_file])
+                if snapshot is not None:
+                    # 缓存只按内容查找，文件改名或内容相同的文件要使用当前的文件名
+                    snapshot['file'] = excel_file.name
+                    print(f"{excel_file.name} 未变化，使用缓存")
+                    sources.append((excel_file, None, snapshot))
+                    continue
             
-            # 验证文件是否有效
-            if not is_valid_excel(excel_file):
-                print(f"跳过无效文件: {excel_file.name}")
+            # 只做结构检查，真正的解析在读取快照时进行且只进行一次
+            error = probe_excel(excel_file)
+            if error:
+                print(f"跳过无效文件: {excel_file.name}（{error}）")
                 continue
             
-            # 如果是xls文件，先转换为xlsx
-            if excel_file.suffix.lower() == '.xls':
+            # 没有 xlrd 时，xls 文件先通过 Excel 转换为 xlsx
+            load_file = excel_file
+            if excel_file.suffix.lower() == '.xls' and xlrd is None:
                 print(f"转换 {excel_file.name} 为xlsx格式")
                 temp_xlsx = convert_xls_to_xlsx(excel_file)
                 if temp_xlsx is None:
                     continue
-                excel_file = temp_xlsx
+                load_file = temp_xlsx
                 temp_files.append(temp_xlsx)
-                
-            try:
-                wb = openpyxl.load_workbook(excel_file, data_only=True)
-            except Exception as e:
-                print(f"无法打开文件 {excel_file.name}: {str(e)}")
+            sources.append((excel_file, load_file, None))
+
+        output_file = output_dir / 'merged_excel.xlsx'
+
+        # 流式模式：逐个文件边读边写，不在内存中保留工作簿
+        if streaming:
+            end_phase('probe')
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            if group_by:
+                print("流式模式不生成分组汇总")
+            stream_merge_files([load_file for _, load_file, _ in sources], output_file)
+            end_phase('stream')
+            print(f"Excel文件已成功合并：{output_file}")
+            return
+
+        # 并行解析缓存未命中的工作簿，由当前进程统一写入
+        pending = [(excel_file, load_file) for excel_file, load_file, snapshot in sources if snapshot is None]
+        loaded = load_workbook_snapshots([load_file for _, load_file in pending], workers)
+        loaded_snapshots = {}
+        for (excel_file, _), snapshot in zip(pending, loaded):
+            loaded_snapshots[excel_file] = snapshot
+            if snapshot_cache and snapshot is not None:
+                snapshot_cache.put(digests[excel_file], snapshot)
+        if snapshot_cache:
+            snapshot_cache.prune()
+
+        snapshots = [snapshot if snapshot is not None else loaded_snapshots[excel_file]
+                     for excel_file, _, snapshot in sources]
+        end_phase('load')
+        for snapshot in snapshots:
+            if snapshot is None:
                 continue
-            
-            # 处理"汇总"sheet
-            if '总表' in wb.sheetnames :
-                print(f"正在处理 {excel_file.name} 的总表sheet")
-                summary_sheets.append(wb['总表'])
-               
-            
-            # 复制其他sheet
-            for sheet_name in wb.sheetnames:
-                if sheet_name != '总表':
-                    print(f"正在复制 {excel_file.name} 的 {sheet_name} sheet")
-                    source_sheet = wb[sheet_name]
-                    # 创建新的sheet，添加序号避免重名
-                    #new_sheet_name = f"{sheet_name}_{len(merged_wb.sheetnames)}"
-                    target_sheet = merged_wb.create_sheet(title=sheet_name)
-                    
-                    # 复制列宽
-                    for col in range(1, source_sheet.max_column + 1):
-                        col_letter = openpyxl.utils.get_column_letter(col)
-                        if col_letter in source_sheet.column_dimensions:
-                            target_sheet.column_dimensions[col_letter].width = \
-                                source_sheet.column_dimensions[col_letter].width
-                    
-                    # 复制行高
-                    for row in range(1, source_sheet.max_row + 1):
-                        if row in source_sheet.row_dimensions:
-                            target_sheet.row_dimensions[row].height = \
-                                source_sheet.row_dimensions[row].height
-                    
-                    # 复制单元格内容和格式
-                    for row in source_sheet.rows:
-                        for cell in row:
-                            new_cell = target_sheet.cell(
-                                row=cell.row, 
-                                column=cell.column,
-                                value=cell.value
-                            )
-                            try:
-                                copy_cell_format(cell, new_cell)
-                            except Exception as e:
-                                print(f"复制单元格格式时出错: {str(e)}")
-                    
-                    # 复制合并单元格
-                    for merged_range in source_sheet.merged_cells.ranges:
-                        target_sheet.merge_cells(str(merged_range))
-            
-            wb.close()
+            for sheet in snapshot['sheets']:
+                # 处理"汇总"sheet
+                if sheet['title'] == '总表':
+                    print(f"正在处理 {snapshot['file']} 的总表sheet")
+                    summary_sheets.append(sheet)
+                    summary_sources.append(source_group(snapshot['file']))
+                    continue
+
+                # 复制其他sheet
+                print(f"正在复制 {snapshot['file']} 的 {sheet['title']} sheet")
+                write_sheet_snapshot(merged_wb, sheet, style_cache)
+        end_phase('copy')
         
         # 创建合并后的汇总sheet
          # 合并汇总表
-        merged_summary_data = merge_summary_sheets(summary_sheets)
+        merged_summary_data = merge_summary_sheets(summary_sheets, summary_sources)
         
         # 写入合并后的数据
         if merged_summary_data:
-            write_merged_summary(merged_wb, merged_summary_data)
+            write_merged_summary(merged_wb, merged_summary_data, style_cache)
+
+            # 按分组统计人数和分数合计
+            if group_by:
+                totals = group_totals(merged_summary_data, group_by, sum_columns)
+                if totals is not None:
+                    write_group_totals(merged_wb, totals)
+        end_phase('summary')
         
         # 保存合并后的文件
-        output_file = output_dir / 'merged_excel.xlsx'
         #
         if os.path.exists(output_file):
             os.remove(output_file)
         merged_wb.save(output_file)
+        end_phase('save')
         print(f"Excel文件已成功合并：{output_file}")
         
     except Exception as e:
@@ -290,4 +1010,14 @@ def merge_excel_files():
             pass
 
 if __name__ == '__main__':
-    merge_excel_files()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='合并 source/performance 下的绩效 Excel 文件')
+    parser.add_argument('--workers', type=int, help='并行读取文件的进程数，默认使用全部 CPU')
+    parser.add_argument('--streaming', action='store_true', help='流式合并，内存占用不随文件大小增长')
+    parser.add_argument('--no-cache', action='store_true', help='不使用快照缓存，重新解析所有文件')
+    parser.add_argument('--group-by', nargs='?', const=SOURCE_GROUP_COLUMN,
+                        help=f'分组统计人数和分数合计，结果写入“分组汇总”sheet；不带列名时按来源文件的组名（{SOURCE_GROUP_COLUMN}）分组，'
+                             '也可指定总表中的列，如 评级')
+    parser.add_argument('--sum', nargs='+', dest='sum_columns', help='分组统计时合计的列，默认合计所有数值列')
+    args = parser.parse_args()
+    merge_excel_files(workers=args.workers, streaming=args.streaming, use_cache=not args.no_cache,
+                      group_by=args.group_by, sum_columns=args.sum_columns)
\ No newline at end of file
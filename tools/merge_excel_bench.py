@@ -0,0 +1,283 @@
+"""
+Excel 合并工具的基准测试。
+
+用法（在仓库根目录执行）：
+    python tools/merge_excel_bench.py merge --groups 4 --rows 5000 --json output/merge_bench.json
+    python tools/merge_excel_bench.py layout --used-rows 1000 10000 100000 --defined 100 1000
+
+merge：生成合成的分组工作簿，执行 merge_excel_files，记录总耗时、峰值内存以及
+读取（load）、复制（copy）、汇总（summary）、保存（save）各阶段耗时。
+layout：比较逐行逐列复制列宽、行高、合并单元格与批量复制的耗时，
+已定义条目数不变时，批量复制的耗时不应随使用区域变大而增长。
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from openpyxl.utils import get_column_letter
+
+from merge_excel import merge_excel_files, sheet_layout, copy_dimensions, copy_merged_ranges
+
+NUMBER_FORMATS = ['General', '0', '0.0', '0.00', '0%', '#,##0', 'yyyy-mm-dd']
+FILL_COLORS = ['FFFFFF', 'DDEBF7', 'FCE4D6', 'E2EFDA', 'FFF2CC', 'EDEDED']
+
+
+def synthetic_styles(count, rng):
+    """生成 count 种不同的单元格样式 (字体, 填充, 边框, 对齐, 数字格式)"""
+    styles = []
+    for i in range(count):
+        styles.append((
+            Font(name='宋体', size=10 + i % 4, bold=i % 2 == 1, italic=i % 5 == 4),
+            PatternFill('solid', fgColor=FILL_COLORS[i % len(FILL_COLORS)]),
+            Border(bottom=Side(style=rng.choice(['thin', 'medium', 'dashed']))),
+            Alignment(horizontal=rng.choice(['left', 'center', 'right'])),
+            NUMBER_FORMATS[i % len(NUMBER_FORMATS)]
+        ))
+    return styles
+
+
+def apply_style(cell, style):
+    """把 synthetic_styles 生成的样式应用到单元格"""
+    cell.font, cell.fill, cell.border, cell.alignment, cell.number_format = style
+
+
+def generate_group_workbooks(source_dir, groups, rows, columns, style_variety, merge_density, seed=0):
+    """在 source_dir 下生成 groups 个分组工作簿，每个包含一个总表和一个明细 sheet"""
+    rng = random.Random(seed)
+    styles = synthetic_styles(max(1, style_variety), rng)
+    header = ['姓名', '组别'] + [f'指标{i}' for i in range(1, max(columns, 3) - 1)]
+    for group in range(groups):
+        wb = openpyxl.Workbook()
+        summary = wb.active
+        summary.title = '总表'
+        summary.append(header)
+        for cell in summary[1]:
+            cell.font = Font(bold=True)
+        for i in range(rows):
+            summary.append([f'员工{group}-{i}', f'组{group}'] + [rng.randint(0, 100) for _ in header[2:]])
+            for cell in summary[i + 2][2:]:
+                apply_style(cell, rng.choice(styles))
+
+        detail = wb.create_sheet(f'组{group}明细')
+        for i in range(rows):
+            detail.append([f'{group}-{i}-{col}' for col in range(len(header))])
+            for cell in detail[i + 1]:
+                apply_style(cell, rng.choice(styles))
+        for col in range(1, len(header) + 1):
+            detail.column_dimensions[get_column_letter(col)].width = 10 + col % 8
+        for row in range(1, rows + 1, 10):
+            detail.row_dimensions[row].height = 18
+        # 合并单元格：每行的前两列，按密度随机选择互不重叠的行
+        for row in rng.sample(range(1, rows + 1), min(rows, int(rows * merge_density))):
+            detail.merge_cells(start_row=row, start_column=1, end_row=row, end_column=2)
+
+        wb.save(source_dir / f'group{group}.xlsx')
+
+
+def run_merge(workdir, workers, streaming, use_cache):
+    """在独立的子进程中执行一次合并，返回总耗时、峰值内存和各阶段耗时"""
+    os.chdir(workdir)
+    timings = {}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        merge_excel_files(workers=workers, streaming=streaming, use_cache=use_cache, timings=timings)
+    elapsed = time.perf_counter() - start
+    # 合并失败时 merge_excel_files 只打印错误信息，通过是否走到保存阶段判断
+    if 'save' not in timings and 'stream' not in timings:
+        raise RuntimeError(output.getvalue().strip().splitlines()[-1])
+
+    result = {'seconds': elapsed, 'phases': timings}
+    if resource:
+        result['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        result['max_worker_rss_mb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return result
+
+
+def run_merge_benchmark(workdir, mode, rounds, workers, use_cache):
+    """每轮在新的进程中合并，避免上一轮的内存峰值和缓存影响结果"""
+    runs = []
+    context = multiprocessing.get_context('spawn')
+    for _ in range(rounds):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            runs.append(executor.submit(run_merge, workdir, workers, mode == 'streaming', use_cache).result())
+
+    phases = {}
+    for run in runs:
+        for phase, seconds in run['phases'].items():
+            phases[phase] = phases.get(phase, 0.0) + seconds / rounds
+    result = {
+        'mode': mode,
+        'rounds': rounds,
+        'seconds_min': min(run['seconds'] for run in runs),
+        'seconds_mean': sum(run['seconds'] for run in runs) / rounds,
+        'phases': phases,
+        'runs': runs,
+    }
+    if resource:
+        result['max_rss_mb'] = max(run['max_rss_mb'] for run in runs)
+        result['max_worker_rss_mb'] = max(run['max_worker_rss_mb'] for run in runs)
+    return result
+
+
+def print_merge_report(result):
+    """打印一种合并模式的测试结果"""
+    print(f"[{result['mode']}] {result['rounds']} 轮，最短 {result['seconds_min']:.2f} s，"
+          f"平均 {result['seconds_mean']:.2f} s")
+    if 'max_rss_mb' in result:
+        print(f"  主进程峰值 RSS {result['max_rss_mb']:.1f} MB，读取进程峰值 RSS {result['max_worker_rss_mb']:.1f} MB")
+    for phase, seconds in result['phases'].items():
+        print(f"  {phase:<8} {seconds * 1000:9.1f} ms")
+
+
+def build_layout_sheet(used_rows, used_columns, defined):
+    """构造稀疏的 sheet：使用区域为 used_rows × used_columns，列宽、行高、合并单元格各定义 defined 个"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.cell(row=used_rows, column=used_columns, value='end')
+    for col in range(1, min(defined, used_columns) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 10 + col % 20
+    # 行高和合并单元格均匀分布在使用区域内，使用区域太小时实际个数会少于 defined
+    step = max(2, (used_rows - 1) // max(defined, 1))
+    for row in range(1, used_rows, step)[:defined]:
+        ws.row_dimensions[row].height = 20
+        ws.merge_cells(start_row=row, start_column=1, end_row=row + 1, end_column=2)
+    return ws
+
+
+def legacy_layout_copy(source_sheet, target_sheet):
+    """原来的复制方式：按使用区域逐列、逐行查找，再逐个 merge_cells"""
+    for col in range(1, source_sheet.max_column + 1):
+        col_letter = get_column_letter(col)
+        if col_letter in source_sheet.column_dimensions:
+            target_sheet.column_dimensions[col_letter].width = source_sheet.column_dimensions[col_letter].width
+    for row in range(1, source_sheet.max_row + 1):
+        if row in source_sheet.row_dimensions:
+            target_sheet.row_dimensions[row].height = source_sheet.row_dimensions[row].height
+    for merged_range in source_sheet.merged_cells.ranges:
+        target_sheet.merge_cells(str(merged_range))
+
+
+def bulk_layout_copy(source_sheet, target_sheet):
+    """merge_excel 当前的复制方式：只遍历已定义的条目，批量写入"""
+    column_widths, row_heights, merged_ranges = sheet_layout(source_sheet)
+    copy_dimensions(target_sheet, column_widths, row_heights)
+    copy_merged_ranges(target_sheet, merged_ranges)
+
+
+def time_copy(copy_layout, source_sheet, rounds):
+    """每轮复制到新的工作簿，返回最短耗时"""
+    best = None
+    for _ in range(rounds):
+        target_sheet = openpyxl.Workbook().active
+        start = time.perf_counter()
+        copy_layout(source_sheet, target_sheet)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_layout_benchmark(used_rows_list, used_columns, defined_list, rounds):
+    """对每组使用区域和已定义条目数分别测试两种复制方式"""
+    results = []
+    for defined in defined_list:
+        for used_rows in used_rows_list:
+            source_sheet = build_layout_sheet(used_rows, used_columns, defined)
+            results.append({
+                'used_rows': used_rows,
+                'used_columns': used_columns,
+                'defined': defined,
+                'merged_ranges': len(source_sheet.merged_cells.ranges),
+                'legacy_ms': time_copy(legacy_layout_copy, source_sheet, rounds) * 1000,
+                'bulk_ms': time_copy(bulk_layout_copy, source_sheet, rounds) * 1000,
+            })
+    return results
+
+
+def print_layout_report(results):
+    """打印列宽、行高、合并单元格复制的测试结果"""
+    print(f"{'使用区域':>14} {'定义条目':>8} {'合并区域':>8} {'逐个复制 ms':>12} {'批量复制 ms':>12}")
+    for result in results:
+        used = f"{result['used_rows']}×{result['used_columns']}"
+        print(f"{used:>14} {result['defined']:>8} {result['merged_ranges']:>8} "
+              f"{result['legacy_ms']:>12.2f} {result['bulk_ms']:>12.2f}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Excel 合并工具基准测试')
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    merge_parser = subparsers.add_parser('merge', help='用合成工作簿测试完整的合并流程')
+    merge_parser.add_argument('--groups', type=int, default=4, help='分组工作簿的个数')
+    merge_parser.add_argument('--rows', type=int, default=2000, help='每个总表和明细 sheet 的行数')
+    merge_parser.add_argument('--columns', type=int, default=10, help='每个 sheet 的列数')
+    merge_parser.add_argument('--styles', type=int, default=8, help='随机使用的单元格样式种数')
+    merge_parser.add_argument('--merge-density', type=float, default=0.05, help='明细 sheet 中合并单元格的行占比')
+    merge_parser.add_argument('--mode', choices=['memory', 'streaming', 'all'], default='all', help='合并模式')
+    merge_parser.add_argument('--workers', type=int, help='并行读取文件的进程数')
+    merge_parser.add_argument('--cache', action='store_true', help='启用快照缓存（第二轮起命中缓存）')
+    merge_parser.add_argument('--rounds', type=int, default=3, help='每种模式的合并轮数')
+    merge_parser.add_argument('--seed', type=int, default=0, help='生成数据的随机种子')
+    merge_parser.add_argument('--workdir', help='在此目录下的 merge_bench 子目录中生成数据和合并结果，默认使用临时目录并在结束后删除')
+    merge_parser.add_argument('--json', metavar='FILE', help='将结果写入 JSON 文件')
+
+    layout_parser = subparsers.add_parser('layout', help='列宽、行高、合并单元格复制的微基准')
+    layout_parser.add_argument('--used-rows', type=int, nargs='+', default=[1000, 10000, 100000], help='使用区域的行数')
+    layout_parser.add_argument('--used-columns', type=int, default=100, help='使用区域的列数')
+    layout_parser.add_argument('--defined', type=int, nargs='+', default=[100, 1000], help='列宽、行高、合并单元格各定义的个数')
+    layout_parser.add_argument('--rounds', type=int, default=3, help='计时轮数，取最短耗时')
+    layout_parser.add_argument('--json', metavar='FILE', help='将结果写入 JSON 文件')
+    args = arg_parser.parse_args()
+
+    if args.command == 'merge':
+        config = {
+            'groups': args.groups, 'rows': args.rows, 'columns': args.columns, 'styles': args.styles,
+            'merge_density': args.merge_density, 'workers': args.workers, 'cache': args.cache, 'seed': args.seed,
+        }
+        with contextlib.ExitStack() as stack:
+            workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory())
+            # 数据和合并结果放在基准测试自己的子目录中，--workdir 指向仓库根目录时也不会删除真实的分组工作簿
+            workdir = Path(workdir).absolute() / 'merge_bench'
+            source_dir = workdir / 'source' / 'performance'
+            source_dir.mkdir(parents=True, exist_ok=True)
+            for old_file in source_dir.glob('*.xls*'):
+                old_file.unlink()
+
+            start = time.perf_counter()
+            generate_group_workbooks(source_dir, args.groups, args.rows, args.columns,
+                                     args.styles, args.merge_density, args.seed)
+            print(f"生成 {args.groups} 个工作簿用时 {time.perf_counter() - start:.2f} s")
+
+            modes = ['memory', 'streaming'] if args.mode == 'all' else [args.mode]
+            runs = []
+            for mode in modes:
+                result = run_merge_benchmark(workdir, mode, max(1, args.rounds), args.workers, args.cache)
+                print_merge_report(result)
+                runs.append(result)
+        results = {'config': config, 'results': runs}
+
+    if args.command == 'layout':
+        results = run_layout_benchmark(args.used_rows, args.used_columns, args.defined, max(1, args.rounds))
+        print_layout_report(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()